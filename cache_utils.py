@@ -14,22 +14,32 @@
 
 """
 URL缓存和ID生成工具模块
-提供URL标准化、随机ID生成、URL缓存管理等功能
+提供URL标准化、随机ID生成、URL缓存管理、网页内容缓存等功能
 """
 
 import pandas as pd
 import string
 import random
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+from typing import Optional
 from urllib.parse import urlparse
 from pathlib import Path
 
 
+# url_cache.csv 的读-改-写需在此锁内完成，多个报告并发处理时才不会互相覆盖新分配的ID
+url_cache_lock = threading.Lock()
+
+
 def generate_random_id(length=10):
     """生成随机字母数字ID"""
     chars = string.ascii_letters + string.digits
     return ''.join(random.choice(chars) for _ in range(length))
 
 
+@lru_cache(maxsize=65536)
 def normalize_url(url: str) -> str:
     """标准化URL，移除锚点等，用于重复检测"""
     parsed = urlparse(url)
@@ -82,4 +92,43 @@ def get_url_id_with_cache(url: str, cache_file: str = "url_cache.csv") -> str:
     url_cache = load_or_create_url_cache(cache_file)
     random_id, updated_cache = get_or_create_id_for_url(url, url_cache)
     save_url_cache(updated_cache, cache_file)
-    return random_id 
\ No newline at end of file
+    return random_id 
+
+class PageCache:
+    """
+    基于SQLite（WAL模式）的网页内容缓存，以标准化URL为键
+    
+    所有网页内容集中存放在一个数据库文件中，避免为每个URL单独打开/读取一个txt文件；
+    单个连接由锁保护，可在多个线程间共享
+    """
+    
+    def __init__(self, db_file: str = "raw_texts.sqlite"):
+        self.db_file = str(db_file)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.db_file, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS pages("
+            "url TEXT PRIMARY KEY, content TEXT, fetched_at INTEGER)"
+        )
+    
+    def get(self, url: str) -> Optional[str]:
+        """读取URL对应的网页内容，不存在时返回None"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM pages WHERE url = ?", (normalize_url(url),)
+            ).fetchone()
+        return row[0] if row else None
+    
+    def put(self, url: str, content: str):
+        """写入（或覆盖）URL对应的网页内容"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages(url, content, fetched_at) VALUES (?, ?, ?)",
+                (normalize_url(url), content, int(time.time()))
+            )
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
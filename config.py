@@ -25,6 +25,19 @@ load_dotenv()  # 读取 .env
 OPENAI_PROVIDER: str = os.getenv("OPENAI_PROVIDER", "openai").lower()
 TEMPERATURE: float = float(os.getenv("TEMPERATURE", 0.0))
 MAX_TOKENS: int = int(os.getenv("MAX_TOKENS", 8192))
+LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", 10))  # chain.batch 的最大并发请求数
+# 单次 LLM 请求的超时（秒）与客户端自带的重试次数，避免挂起的请求拖住整个线程池
+LLM_TIMEOUT: float = float(os.getenv("LLM_TIMEOUT", 300))
+LLM_MAX_RETRIES: int = int(os.getenv("LLM_MAX_RETRIES", 3))
+# 主动限流（令牌桶）：每分钟请求数 / token 数，0 表示不限制
+LLM_RPM: int = int(os.getenv("LLM_RPM", 0))
+LLM_TPM: int = int(os.getenv("LLM_TPM", 0))
+# LLM 回复缓存（SQLite），设为空字符串可禁用
+LLM_CACHE_FILE: str = os.getenv("LLM_CACHE_FILE", "llm_cache.db")
+# 文本分块结果（各块偏移）的磁盘缓存目录，重跑时同一报告无需重新分块；设为空字符串可禁用
+SPLIT_CACHE_DIR: str = os.getenv("SPLIT_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "reportbench", "splits"))
+# 匹配句子时原文超过该长度（字符）则先用 BM25 检索相关段落，只把检索结果发给 LLM；0 表示不检索
+MATCH_CONTEXT_CHARS: int = int(os.getenv("MATCH_CONTEXT_CHARS", 32768))
 FIRECRAWL_API_KEY = os.getenv("FIRECRAWL_API_KEY", "")
 
 # ◆ SerpAPI 配置 ◆ -------------------------------------------------
@@ -42,4 +55,7 @@ AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY", "")
 
 # ◆ WebLLM ◆ -------------------------------------------------
 WEB_LLM_KEY = os.getenv("WEB_LLM_KEY", "")
-WEB_LLM_BASE_URL = os.getenv("WEB_LLM_BASE_URL", "")
\ No newline at end of file
+WEB_LLM_BASE_URL = os.getenv("WEB_LLM_BASE_URL", "")
+WEB_LLM_RPM: int = int(os.getenv("WEB_LLM_RPM", 0))
+WEB_LLM_TPM: int = int(os.getenv("WEB_LLM_TPM", 0))
+WEB_LLM_TIMEOUT: float = float(os.getenv("WEB_LLM_TIMEOUT", 300))
\ No newline at end of file
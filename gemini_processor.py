@@ -15,8 +15,8 @@
 import json
 import re
 import os
-import glob
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from bs4 import BeautifulSoup, NavigableString
 
 
@@ -270,62 +270,65 @@ def process_gemini_result(gemini_json_file, gemini_md_file, output_file):
     json.dump(result, fout, ensure_ascii=False)
 
 
-if __name__ == '__main__':
-    # 创建命令行参数解析器
-    parser = argparse.ArgumentParser(description='处理Gemini结果文件')
-    parser.add_argument('--input-dir', default='gemini', 
-                       help='输入目录路径，包含gemini JSON和MD文件 (默认: gemini)')
-    parser.add_argument('--output-dir', default='result_gemini',
-                       help='输出目录路径，用于保存处理后的结果 (默认: result_gemini)')
-    
-    # 解析命令行参数
-    args = parser.parse_args()
-    input_dir = args.input_dir
-    output_dir = args.output_dir
-    
+def _process_one(json_file, input_dir, output_dir):
+    """处理单个gemini JSON/MD文件对，返回 (基础文件名, 是否成功)"""
+    # 获取基础文件名（不包含扩展名）
+    base_name = os.path.basename(json_file).replace('.json', '')
+    try:
+        # 构造对应的md文件路径
+        md_file = os.path.join(input_dir, base_name + '.md')
+        
+        # 检查md文件是否存在
+        if not os.path.exists(md_file):
+            print(f"警告：找不到对应的md文件: {md_file}")
+            return base_name, False
+        
+        # 构造输出文件路径
+        output_file = os.path.join(output_dir, base_name + '_parsed.json')
+        
+        print(f"正在处理: {json_file} 和 {md_file}")
+        print(f"输出到: {output_file}")
+        
+        # 处理文件
+        process_gemini_result(json_file, md_file, output_file)
+        print(f"成功处理: {base_name}")
+        return base_name, True
+        
+    except Exception as e:
+        print(f"处理文件出错 {json_file}: {str(e)}")
+        return base_name, False
+
+
+def process_all_files(input_dir, output_dir, workers=None):
+    """并行处理目录下的所有gemini结果文件"""
     # 创建输出目录
     os.makedirs(output_dir, exist_ok=True)
     
-    # 查找所有gemini JSON文件
-    json_pattern = os.path.join(input_dir, "*.json")
-    json_files = glob.glob(json_pattern)
+    # 查找所有gemini JSON文件（scandir直接返回目录项，无需额外stat）
+    with os.scandir(input_dir) as it:
+        json_files = sorted(entry.path for entry in it if entry.name.endswith('.json') and entry.is_file())
     
     processed_count = 0
     error_count = 0
     failed_files = []  # 记录失败的文件名
     
-    for json_file in json_files:
-        try:
-            # 获取基础文件名（不包含扩展名）
-            base_name = os.path.basename(json_file).replace('.json', '')
-            
-            # 构造对应的md文件路径
-            md_file = os.path.join(input_dir, base_name + '.md')
-            
-            # 检查md文件是否存在
-            if not os.path.exists(md_file):
-                print(f"警告：找不到对应的md文件: {md_file}")
-                failed_files.append(base_name)  # 记录失败的文件名
-                error_count += 1
-                continue
-            
-            # 构造输出文件路径
-            output_file = os.path.join(output_dir, base_name + '_parsed.json')
-            
-            print(f"正在处理: {json_file} 和 {md_file}")
-            print(f"输出到: {output_file}")
-            
-            # 处理文件
-            process_gemini_result(json_file, md_file, output_file)
+    # HTML/Markdown解析是纯CPU计算且文件之间相互独立，使用进程池并行处理
+    workers = max(1, min(workers or os.cpu_count() or 1, len(json_files) or 1))
+    if workers == 1:
+        results = [_process_one(json_file, input_dir, output_dir) for json_file in json_files]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(
+                _process_one, json_files,
+                [input_dir] * len(json_files), [output_dir] * len(json_files)
+            ))
+    
+    for base_name, ok in results:
+        if ok:
             processed_count += 1
-            print(f"成功处理 #{processed_count}: {base_name}")
-            
-        except Exception as e:
+        else:
             error_count += 1
-            base_name = os.path.basename(json_file).replace('.json', '')
             failed_files.append(base_name)  # 记录失败的文件名
-            print(f"处理文件出错 {json_file}: {str(e)}")
-            continue
     
     print(f"\n处理完成！")
     print(f"成功处理: {processed_count} 个文件")
@@ -339,3 +342,19 @@ if __name__ == '__main__':
             print(f"{i}. {failed_file}")
     else:
         print(f"\n所有文件都处理成功！")
+
+
+if __name__ == '__main__':
+    # 创建命令行参数解析器
+    parser = argparse.ArgumentParser(description='处理Gemini结果文件')
+    parser.add_argument('--input-dir', default='gemini', 
+                       help='输入目录路径，包含gemini JSON和MD文件 (默认: gemini)')
+    parser.add_argument('--output-dir', default='result_gemini',
+                       help='输出目录路径，用于保存处理后的结果 (默认: result_gemini)')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='并行进程数 (默认: CPU核数)')
+    
+    # 解析命令行参数
+    args = parser.parse_args()
+    
+    process_all_files(args.input_dir, args.output_dir, workers=args.workers)
@@ -21,6 +21,7 @@ Process模块 - 包含数据处理相关的功能模块
 - extract_reference_structured: 从HTML中提取结构化的引用数据  
 - html2markdown: HTML转Markdown的转换功能
 - process_json: JSON文件处理功能
+- batch: 多文件并行处理功能
 """
 
 __version__ = "1.0.0"
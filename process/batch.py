@@ -0,0 +1,88 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+批量并行处理工具
+JSON解析和HTML解析都是纯CPU计算且文件之间没有共享状态，
+使用进程池绕开GIL，N个文件在N个核心上并行处理
+"""
+
+import os
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from process.process_json import process_openai_json, save_result
+
+
+def batch_process(paths, func=process_openai_json, n_workers=None, chunksize=8):
+    """
+    使用进程池对多个文件并行执行同一个处理函数
+
+    Args:
+        paths: 文件路径列表
+        func: 模块级处理函数（需可pickle），接受单个文件路径，
+              如 process_openai_json / extract_activity_structured / extract_reference_structured
+        n_workers: 进程数，默认为CPU核数
+        chunksize: 每次分发给子进程的文件数
+
+    Returns:
+        list: 与paths顺序一致的处理结果
+    """
+    paths = list(paths)
+    if not paths:
+        return []
+
+    n_workers = min(n_workers or os.cpu_count() or 1, len(paths))
+    if n_workers == 1:
+        return [func(path) for path in paths]
+
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        return list(executor.map(func, paths, chunksize=chunksize))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并行处理OpenAI对话JSON文件')
+    parser.add_argument('input_dir', help='包含JSON文件的输入目录')
+    parser.add_argument('--output-dir', default='processed', help='输出目录 (默认: processed)')
+    parser.add_argument('--workers', type=int, default=None, help='进程数 (默认: CPU核数)')
+    args = parser.parse_args()
+
+    json_files = sorted(
+        os.path.join(args.input_dir, name)
+        for name in os.listdir(args.input_dir)
+        if name.endswith('.json')
+    )
+    if not json_files:
+        print(f"在目录 {args.input_dir} 中未找到JSON文件")
+        return
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    print(f"开始并行处理 {len(json_files)} 个文件...")
+
+    results = batch_process(json_files, n_workers=args.workers)
+
+    success_count = 0
+    for file_path, result in zip(json_files, results):
+        if result:
+            save_result(result, os.path.join(args.output_dir, os.path.basename(file_path)))
+            success_count += 1
+
+    print(f"\n处理完成！成功 {success_count}/{len(json_files)} 个文件")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,9 +17,60 @@
 
 import json
 import re
+from functools import lru_cache
 from bs4 import BeautifulSoup
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# 活动分类使用的正则
+_CHATGPT_PREFIX_RE = re.compile(r'^ChatGPT\s*')
+_SEARCH_QUERY_RE = re.compile(r'Searched for (.+)')
+_WEBSITE_RE = re.compile(r'(?:https?://)?([a-zA-Z0-9.-]+\.[a-zA-Z]{2,})')
+
+
+@lru_cache(maxsize=100_000)
+def _classify_text_block(text_content):
+    """
+    识别单个文本块的活动类型
+    
+    纯函数，结果按文本缓存：批量处理时重复出现的文本块（标题、常见搜索等）直接命中缓存
+    
+    Returns:
+        tuple | None: (类型, 内容, 附加字段元组)，需要跳过的文本块返回None
+    """
+    if not text_content or len(text_content) < 10:
+        return None
+    
+    # 清理ChatGPT前缀（文本块来自get_text(strip=True)，尾部已无空白）
+    cleaned_content = _CHATGPT_PREFIX_RE.sub('', text_content, count=1)
+    
+    # 跳过太短的内容
+    if len(cleaned_content) < 10:
+        return None
+    
+    # 识别搜索活动
+    if 'Searched for' in text_content:
+        # 提取搜索关键词
+        match = _SEARCH_QUERY_RE.search(text_content)
+        if not match:
+            return None
+        search_query = match.group(1).strip()
+        return '搜索', f"搜索关键词: {search_query}", (('search_query', search_query),)
+    
+    # 识别读取网站活动（"读取网站"、"读取来自"都以"读取"开头，一次子串判断即可覆盖）
+    if '读取' in text_content:
+        # 提取网站URL
+        url_match = _WEBSITE_RE.search(text_content)
+        website = url_match.group(1) if url_match else "未知网站"
+        return '读取网站', cleaned_content, (('website', website),)
+    
+    # 识别思考活动（其他所有内容）
+    return '思考', cleaned_content, ()
+
 def extract_activity_structured(json_file_path=None, activity_html=None, log=None):
     """
     从JSON文件或直接从HTML字符串中提取activity字段并解析出结构化的活动数据
@@ -71,59 +122,19 @@ def extract_activity_structured(json_file_path=None, activity_html=None, log=Non
     
     # 2. 识别和分类每个文本块
     for text_content in unique_blocks:
-        if not text_content or len(text_content) < 10:
-            continue
-            
-        # 清理ChatGPT前缀
-        cleaned_content = text_content
-        if cleaned_content.startswith('ChatGPT'):
-            cleaned_content = cleaned_content[7:].strip()
-            
-        # 跳过太短的内容
-        if len(cleaned_content) < 10:
+        classified = _classify_text_block(text_content)
+        if classified is None:
             continue
         
-        # 识别搜索活动
-        if 'Searched for' in text_content:
-            # 提取搜索关键词
-            search_pattern = r'Searched for (.+)'
-            match = re.search(search_pattern, text_content)
-            if match:
-                search_query = match.group(1).strip()
-                activity = {
-                    'index': activity_index,
-                    'type': '搜索',
-                    'content': f"搜索关键词: {search_query}",
-                    'search_query': search_query
-                }
-                structured_activities.append(activity)
-                activity_index += 1
-                
-        # 识别读取网站活动
-        elif any(keyword in text_content for keyword in ['读取', '读取网站', '读取来自']):
-            # 提取网站URL
-            url_pattern = r'(?:https?://)?([a-zA-Z0-9.-]+\.[a-zA-Z]{2,})'
-            url_match = re.search(url_pattern, text_content)
-            website = url_match.group(1) if url_match else "未知网站"
-            
-            activity = {
-                'index': activity_index,
-                'type': '读取网站',
-                'content': cleaned_content,
-                'website': website
-            }
-            structured_activities.append(activity)
-            activity_index += 1
-            
-        # 识别思考活动（其他所有内容）
-        else:
-            activity = {
-                'index': activity_index,
-                'type': '思考',
-                'content': cleaned_content
-            }
-            structured_activities.append(activity)
-            activity_index += 1
+        activity_type, content, extra_fields = classified
+        activity = {
+            'index': activity_index,
+            'type': activity_type,
+            'content': content
+        }
+        activity.update(extra_fields)
+        structured_activities.append(activity)
+        activity_index += 1
     
     # 去重和清理
     cleaned_activities = []
@@ -165,7 +176,11 @@ def extract_activity_structured(json_file_path=None, activity_html=None, log=Non
     return result
 
 def save_structured_data(structured_data, output_file):
-    """保存结构化数据到文件"""
+    """保存结构化数据到文件（优先使用orjson一次性编码写出）"""
+    if orjson is not None:
+        with open(output_file, 'wb') as f:
+            f.write(orjson.dumps(structured_data, option=orjson.OPT_INDENT_2))
+        return
     with open(output_file, 'w', encoding='utf-8') as f:
         json.dump(structured_data, f, ensure_ascii=False, indent=2)
 
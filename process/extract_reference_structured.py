@@ -16,11 +16,19 @@
 # -*- coding: utf-8 -*-
 
 import json
-import re
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse
 from datetime import datetime
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def _is_source_marker(text):
+    """判断文本节点是否包含"全部来源"或"All Sources"分界标识（纯子串判断，不走正则引擎）"""
+    return '全部来源' in text or 'All Sources' in text
+
 def extract_reference_structured(json_file_path=None, reference_html=None, log=None):
     """
     从JSON文件或直接从HTML字符串中提取并结构化reference字段的信息
@@ -55,7 +63,7 @@ def extract_reference_structured(json_file_path=None, reference_html=None, log=N
         log(f"🔍 总共找到 {len(all_links)} 个链接")
     
     # 查找"全部来源"或"All Sources"文本来定位分界点
-    source_element = soup.find(string=re.compile(r'全部来源|All Sources'))
+    source_element = soup.find(string=_is_source_marker)
     if not source_element:
         if log:
             log("❌ 未找到'全部来源'或'All Sources'标识，无法分割详细引用和域名汇总")
@@ -76,8 +84,16 @@ def extract_reference_structured(json_file_path=None, reference_html=None, log=N
     detailed_references = []
     domain_summary = []
     
+    # 链接按文档顺序出现，维护一个单调前进的查找起点，整体查找开销为O(|HTML|)
+    search_start = 0
     for link in all_links:
-        link_position = str(soup).find(str(link))
+        link_html = str(link)
+        link_position = html_str.find(link_html, search_start)
+        if link_position == -1:
+            # 兜底：从头查找（如嵌套在上一个链接内的情况）
+            link_position = html_str.find(link_html)
+        else:
+            search_start = link_position + len(link_html)
         if link_position < source_position:
             # 在"全部来源"之前的为详细引用
             ref_info = extract_detailed_reference_simple(link, len(detailed_references) + 1)
@@ -152,14 +168,10 @@ def extract_domain_info_simple(link, index):
     display_text = link.get_text(strip=True)
     
     # 从display_text中提取域名和计数
-    domain = display_text
-    count = 1
-    
-    # 检查是否有数字后缀（如"sohu2"表示2次）
-    count_match = re.search(r'(\d+)$', display_text)
-    if count_match:
-        count = int(count_match.group(1))
-        domain = re.sub(r'\d+$', '', display_text)
+    # 检查是否有数字后缀（如"sohu2"表示2次），一次rstrip同时得到域名和后缀
+    domain = display_text.rstrip('0123456789')
+    suffix = display_text[len(domain):]
+    count = int(suffix) if suffix else 1
     
     return {
         'index': index,
@@ -213,8 +225,12 @@ def main():
         output_file = f'reference_structured_from_{base_name}.json'
         
         # 保存结构化数据到文件
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            with open(output_file, 'wb') as f:
+                f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+        else:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
         
         print("✅ Reference字段解析完成！")
         print(f"📊 解析摘要:")
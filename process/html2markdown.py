@@ -25,6 +25,18 @@ HTML到Markdown转换工具
 import re
 from urllib.parse import urlparse
 
+# 预编译fix_common_markdown_issues中使用的正则
+_MULTI_NL_RE = re.compile(r'\n{3,}')
+_LINK_FIX_RE = re.compile(r'\[([^\]]*)\]\(([^)]*)\)')
+
+# 匹配 div/span 的开始标签（含属性）和结束标签，一次扫描全部移除
+_DIV_SPAN_TAG_RE = re.compile(r'<(?:div|span)[^>]*>|</(?:div|span)>')
+
+def _fix_link_spaces(match):
+    """将链接URL中未编码的空格替换为%20"""
+    text, url = match.groups()
+    return f'[{text}]({url.replace(" ", "%20")})'
+
 def create_html_to_markdown_prompt(html_content: str) -> str:
     """
     创建HTML转Markdown的提示词
@@ -193,32 +205,29 @@ def fix_common_markdown_issues(markdown_content: str) -> str:
         str: 修复后的Markdown内容
     """
     # 修复多余的空行（超过2个连续空行改为2个）
-    markdown_content = re.sub(r'\n{3,}', '\n\n', markdown_content)
+    markdown_content = _MULTI_NL_RE.sub('\n\n', markdown_content)
     
     # 修复链接中的未编码空格
-    def fix_link_spaces(match):
-        text, url = match.groups()
-        fixed_url = url.replace(' ', '%20')
-        return f'[{text}]({fixed_url})'
-    
-    markdown_content = re.sub(r'\[([^\]]*)\]\(([^)]*)\)', fix_link_spaces, markdown_content)
+    markdown_content = _LINK_FIX_RE.sub(_fix_link_spaces, markdown_content)
     
     # 修复表格前后的空行
     lines = markdown_content.split('\n')
     fixed_lines = []
     
+    last_index = len(lines) - 1
+    
     for i, line in enumerate(lines):
-        fixed_lines.append(line)
+        is_table_line = '|' in line and line.strip()
         
-        # 在表格前添加空行
-        if '|' in line and line.strip():
-            if i > 0 and lines[i-1].strip() and '|' not in lines[i-1]:
-                fixed_lines.insert(-1, '')
+        # 在表格前添加空行（先追加空行再追加当前行，避免list.insert移动元素）
+        if is_table_line and i > 0 and lines[i-1].strip() and '|' not in lines[i-1]:
+            fixed_lines.append('')
+        
+        fixed_lines.append(line)
         
         # 在表格后添加空行
-        if i < len(lines) - 1:
-            if '|' in line and line.strip() and '|' not in lines[i+1] and lines[i+1].strip():
-                fixed_lines.append('')
+        if is_table_line and i < last_index and '|' not in lines[i+1] and lines[i+1].strip():
+            fixed_lines.append('')
     
     return '\n'.join(fixed_lines)
 
@@ -255,21 +264,8 @@ def post_process_report(raw: str) -> str:
     Returns:
         str: 移除 div 和 span 标签后的字符串
     """
-    # 移除 div 开始标签（包括带属性的）
-    # 匹配 <div> 或 <div 任何属性>
-    raw = re.sub(r'<div[^>]*>', '', raw)
-    
-    # 移除 div 结束标签
-    raw = re.sub(r'</div>', '', raw)
-    
-    # 移除 span 开始标签（包括带属性的）
-    # 匹配 <span> 或 <span 任何属性>
-    raw = re.sub(r'<span[^>]*>', '', raw)
-    
-    # 移除 span 结束标签
-    raw = re.sub(r'</span>', '', raw)
-    
-    return raw
+    # 单次扫描同时移除 <div ...>、</div>、<span ...>、</span>
+    return _DIV_SPAN_TAG_RE.sub('', raw)
 
 def process_html_content(html_content: str) -> str:
     """
@@ -14,6 +14,11 @@
 
 import json
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 def process_openai_json(file_path):
     """
     处理OpenAI对话JSON文件，提取指定信息
@@ -94,8 +99,13 @@ def save_result(result, output_file):
         output_file: 输出文件路径
     """
     try:
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            # orjson在C中一次性编码，默认即输出UTF-8原文（等价于ensure_ascii=False）
+            with open(output_file, 'wb') as f:
+                f.write(orjson.dumps(result, option=orjson.OPT_INDENT_2))
+        else:
+            with open(output_file, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
         print(f"结果已保存到: {output_file}")
     except Exception as e:
         print(f"保存文件时出错: {e}")
@@ -17,22 +17,224 @@
 遍历survey_bench_result目录下的JSON文件，提取URL并与ground truth比较评估
 """
 import json
+import hashlib
+import mmap
 import re
 import os
 import argparse
+import string
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Dict, Optional, Set, Tuple
+from typing import Callable, List, Dict, Optional, Set, Tuple
+import numpy as np
 import pandas as pd
 from collections import defaultdict
 
-from utils import build_llm, save_csv
-from cache_utils import normalize_url
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from rapidfuzz import fuzz, process as rf_process
+except ImportError:
+    fuzz = rf_process = None
+
+from utils import build_llm, save_csv, save_rows_csv, save_parquet, retry_on_token_limit, llm_rate_limiter, estimate_tokens
+from cache_utils import normalize_url, load_or_create_url_cache, get_or_create_id_for_url, save_url_cache, PageCache
+
+
+# 送入LLM的内容截断长度（字符数）
+PAGE_CONTENT_LIMIT = 8000      # 单个网页内容
+SURVEY_CONTENT_LIMIT = 12000   # no-url模式下的综述内容
+
+# LLM提示词模板（静态部分只构造一次，调用时用format_map填充）
+PROMPT_ANALYZE_PAPER = """
+请分析以下网页内容，判断它是否是一篇学术论文。如果是学术论文，请提取标题和作者信息。
+
+网页URL: {url}
+
+网页内容:
+{content}
+
+请以JSON格式回复，包含以下字段：
+- is_academic_paper: true/false
+- title: 论文标题（如果是学术论文）
+- authors: 作者列表（如果是学术论文）
+- reason: 判断理由
+
+示例:
+{{
+    "is_academic_paper": true,
+    "title": "Deep Learning for Natural Language Processing",
+    "authors": ["John Smith", "Jane Doe"],
+    "reason": "包含摘要、关键词、实验结果等学术论文特征"
+}}
+"""
+
+PROMPT_BATCH_DOCUMENT = "[{index}] 网页URL: {url}\n网页内容:\n{content}"
+
+PROMPT_ANALYZE_PAPERS_BATCH = """
+请分别分析以下 {count} 个网页的内容，判断每个网页是否是一篇学术论文。如果是学术论文，请提取标题和作者信息。
+
+{documents}
+
+请以JSON数组格式回复，数组中按编号顺序恰好包含 {count} 个对象，每个对象包含以下字段：
+- index: 网页编号
+- is_academic_paper: true/false
+- title: 论文标题（如果是学术论文）
+- authors: 作者列表（如果是学术论文）
+- reason: 判断理由
+
+示例:
+[
+    {{
+        "index": 1,
+        "is_academic_paper": true,
+        "title": "Deep Learning for Natural Language Processing",
+        "authors": ["John Smith", "Jane Doe"],
+        "reason": "包含摘要、关键词、实验结果等学术论文特征"
+    }}
+]
+"""
+
+PROMPT_EXTRACT_REFERENCES = """
+请分析以下学术综述内容，提取其中引用的所有学术论文的标题和作者信息。
+
+综述内容:
+{response}  
+
+请以JSON格式回复，包含一个papers数组，每个论文对象包含以下字段：
+- title: 论文标题
+- authors: 作者列表
+- is_academic_paper: true（表示这是学术论文）
+
+示例格式:
+{{
+    "papers": [
+        {{
+            "title": "Deep Learning for Natural Language Processing",
+            "authors": ["John Smith", "Jane Doe"],
+            "is_academic_paper": true
+        }},
+        {{
+            "title": "Attention Is All You Need",
+            "authors": ["Ashish Vaswani", "Noam Shazeer"],
+            "is_academic_paper": true
+        }}
+    ]
+}}
+
+注意：只提取明确提到的学术论文，不要包含书籍、网站或其他类型的文献。
+"""
+
+# 预编译的URL匹配模式，避免每个文件重复编译
+_URL_RE = re.compile(r'(https?://[^\s\)\]\"\'>]+)')
+
+# 文件名中的arXiv ID（如 2108.09091）
+_ARXIV_ID_RE = re.compile(r'(\d{4}\.\d{5})')
+
+# 标题标准化用的标点删除表
+_PUNCT_TABLE = str.maketrans('', '', string.punctuation)
+
+
+def _load_json_file(path: Path):
+    """读取JSON文件，优先使用orjson解析"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw.decode('utf-8'))
+
+
+def _find_json_span(text: str, open_char: str = '{', close_char: str = '}') -> Optional[str]:
+    """截取LLM回复中第一个开括号到最后一个闭括号之间的JSON文本，找不到时返回None"""
+    json_start = text.find(open_char)
+    json_end = text.rfind(close_char) + 1
+    if json_start >= 0 and json_end > json_start:
+        return text[json_start:json_end]
+    return None
+
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _extract_jsons(text: str, open_char: str = '{'):
+    """
+    从LLM回复中依次产出所有以open_char开头的顶层JSON值
+    
+    在每个候选开括号处用raw_decode直接解析，成功后从该值末尾继续查找，
+    可跳过正文中无效的括号，也能处理回复中包含多个JSON对象的情况
+    """
+    pos = text.find(open_char)
+    while pos >= 0:
+        try:
+            obj, end = _JSON_DECODER.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            pos = text.find(open_char, pos + 1)
+            continue
+        yield obj
+        pos = text.find(open_char, end)
+
+
+def _parse_llm_json(text: str, open_char: str = '{', close_char: str = '}'):
+    """
+    解析LLM回复中的第一个JSON值
+    
+    Returns:
+        解析出的JSON值；回复中没有open_char时返回None
+    Raises:
+        json.JSONDecodeError: 存在括号但无法解析出任何JSON值
+    """
+    obj = next(_extract_jsons(text, open_char), None)
+    if obj is not None:
+        return obj
+    json_text = _find_json_span(text, open_char, close_char)
+    if json_text is None:
+        return None
+    return json.loads(json_text)
+
+
+def _parse_paper_analysis(text: str) -> Optional[Dict]:
+    """解析单个网页的分析结果，回复中没有合法的JSON对象时返回None"""
+    try:
+        analysis = _parse_llm_json(text)
+    except json.JSONDecodeError:
+        return None
+    return analysis if isinstance(analysis, dict) else None
+
+
+@lru_cache(maxsize=8192)
+def _normalize_title(title: str) -> str:
+    """转换为小写，移除标点和多余空格；同一批ground truth标题会在多个文件间重复出现，结果做缓存"""
+    return ' '.join(title.lower().translate(_PUNCT_TABLE).split())
+
+
+def _load_jsonl_file(path: Path) -> list:
+    """
+    读取JSONL文件（跳过空行），有orjson时将所有行拼成一个数组一次性解析
+    
+    通过mmap按字节逐行读取，由操作系统按需分页，不经过文本解码层
+    """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            lines = [line for line in iter(mm.readline, b'') if line.strip()]
+    if orjson is not None:
+        return orjson.loads(b'[' + b','.join(lines) + b']')
+    return [json.loads(line) for line in lines]
 
 
 class SurveyEvaluationWorkflow:
     """学术论文综述评估工作流程"""
     
-    def __init__(self, survey_dir, ground_truth_dir, result_dir, use_cache=True, no_url=False, cache_file="url_cache.csv"):
+    def __init__(self, survey_dir, ground_truth_dir, result_dir, use_cache=True, no_url=False, cache_file="url_cache.csv", concurrency=8,
+                 fetch_workers=16, analyze_batch_size=1, fuzzy_match=False, fuzzy_threshold=90,
+                 legacy_cache=False, page_cache_file="raw_texts.sqlite", parquet=False):
         self.survey_dir = Path(survey_dir)
         self.ground_truth_dir = Path(ground_truth_dir)
         self.result_dir = Path(result_dir)
@@ -40,6 +242,29 @@ class SurveyEvaluationWorkflow:
         self.use_cache = use_cache  # 是否使用缓存的开关
         self.no_url = no_url  # 是否启用no-url模式
         self.cache_file = cache_file  # URL缓存文件路径
+        self.concurrency = max(1, concurrency)  # 同时处理的文件数
+        self.fetch_workers = max(1, fetch_workers)  # 单个文件内并发抓取的URL数
+        self.analyze_batch_size = max(1, analyze_batch_size)  # 每次LLM请求分析的网页数
+        
+        # 标题模糊匹配（需要rapidfuzz），默认关闭以保持与精确匹配结果一致
+        if fuzzy_match and rf_process is None:
+            print("警告: 未安装rapidfuzz，回退到精确标题匹配")
+            fuzzy_match = False
+        self.fuzzy_match = fuzzy_match
+        self.fuzzy_threshold = fuzzy_threshold
+        self.parquet = parquet  # 标题比较结果是否保存为Parquet
+        
+        # 网页内容缓存：默认存放在SQLite数据库中，legacy模式下沿用 raw_texts/<id>.txt
+        self.legacy_cache = legacy_cache
+        self._page_cache = None if legacy_cache else PageCache(page_cache_file)
+        
+        # URL缓存表在多个文件（线程）之间共享，读写需要加锁
+        self._url_cache = None
+        self._url_cache_lock = threading.Lock()
+        
+        # LLM客户端在所有文件和线程间复用，连接池随之复用，避免重复建立TCP/TLS连接
+        self._llm = None
+        self._llm_lock = threading.Lock()
         
         # 汇总结果
         self.evaluation_results = []
@@ -55,36 +280,58 @@ class SurveyEvaluationWorkflow:
             print(f"错误: {self.survey_dir} 目录下没有找到JSON文件")
             return
         
-        print(f"找到 {len(json_files)} 个JSON文件")
+        print(f"找到 {len(json_files)} 个JSON文件，并发数: {self.concurrency}")
         
-        # 逐文件处理
-        for i, json_file in enumerate(json_files, 1):
+        # 文件之间没有数据依赖，且耗时主要在网页抓取和LLM调用上，使用线程池并发处理
+        results = [None] * len(json_files)
+        
+        def _process(index: int, json_file: Path) -> Optional[Dict]:
             print(f"\n{'='*80}")
-            print(f"处理文件 {i}/{len(json_files)}: {json_file.name}")
+            print(f"处理文件 {index + 1}/{len(json_files)}: {json_file.name}")
             print(f"{'='*80}")
+            return self.process_single_file(json_file)
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            futures = {
+                executor.submit(_process, i, json_file): i
+                for i, json_file in enumerate(json_files)
+            }
             
-            try:
-                result = self.process_single_file(json_file)
-                if result:
-                    self.evaluation_results.append(result)
-                    print(f"✓ 文件 {json_file.name} 处理完成")
-                else:
-                    print(f"✗ 文件 {json_file.name} 处理失败")
-            except Exception as e:
-                import traceback
-                traceback.print_exc()
-                print(f"✗ 文件 {json_file.name} 处理失败: {e}")
-                continue
+            for future in as_completed(futures):
+                index = futures[future]
+                json_file = json_files[index]
+                try:
+                    result = future.result()
+                    if result:
+                        results[index] = result
+                        print(f"✓ 文件 {json_file.name} 处理完成")
+                    else:
+                        print(f"✗ 文件 {json_file.name} 处理失败")
+                except Exception as e:
+                    traceback.print_exc()
+                    print(f"✗ 文件 {json_file.name} 处理失败: {e}")
+        
+        # 按文件顺序汇总结果
+        self.evaluation_results = [result for result in results if result]
         
         # 生成最终统计报告
         self.generate_final_report()
         print(f"\n处理完成! 结果保存在: {self.result_dir}")
         
+    @property
+    def llm(self):
+        """首次使用时创建LLM客户端，之后复用同一个实例"""
+        if self._llm is None:
+            with self._llm_lock:
+                if self._llm is None:
+                    self._llm = build_llm()
+        return self._llm
+        
     def extract_arxiv_id(self, filename: str) -> Optional[str]:
         """从文件名中提取arXiv ID"""
         # 文件名格式: parsed_liminghao+openai+2108.09091.json
         # 提取最后的数字部分作为arXiv ID
-        match = re.search(r'(\d{4}\.\d{5})', filename)
+        match = _ARXIV_ID_RE.search(filename)
         if match:
             return match.group(1)
         return None
@@ -143,46 +390,17 @@ class SurveyEvaluationWorkflow:
         print("使用LLM直接从文件内容中提取参考文献论文题目...")
         
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                response = data.get('response', '')
-                
+            data = _load_json_file(json_file)
+            response = data.get('response', '')
+            
             if not response:
                 print("警告: JSON文件中没有response内容")
                 return []
             
-            llm = build_llm()
+            llm = self.llm
             
             # 构造提取参考文献的prompt
-            prompt = f"""
-请分析以下学术综述内容，提取其中引用的所有学术论文的标题和作者信息。
-
-综述内容:
-{response[:12000]}  
-
-请以JSON格式回复，包含一个papers数组，每个论文对象包含以下字段：
-- title: 论文标题
-- authors: 作者列表
-- is_academic_paper: true（表示这是学术论文）
-
-示例格式:
-{{
-    "papers": [
-        {{
-            "title": "Deep Learning for Natural Language Processing",
-            "authors": ["John Smith", "Jane Doe"],
-            "is_academic_paper": true
-        }},
-        {{
-            "title": "Attention Is All You Need",
-            "authors": ["Ashish Vaswani", "Noam Shazeer"],
-            "is_academic_paper": true
-        }}
-    ]
-}}
-
-注意：只提取明确提到的学术论文，不要包含书籍、网站或其他类型的文献。
-"""
+            prompt = PROMPT_EXTRACT_REFERENCES.format_map({'response': response[:SURVEY_CONTENT_LIMIT]})
             
             response_text = llm.invoke(prompt)
             result_text = response_text.content
@@ -190,11 +408,8 @@ class SurveyEvaluationWorkflow:
             # 解析LLM回复
             try:
                 # 提取JSON部分
-                json_start = result_text.find('{')
-                json_end = result_text.rfind('}') + 1
-                if json_start >= 0 and json_end > json_start:
-                    json_text = result_text[json_start:json_end]
-                    analysis = json.loads(json_text)
+                analysis = _parse_llm_json(result_text)
+                if isinstance(analysis, dict):
                     papers_list = analysis.get('papers', [])
                 else:
                     print("警告: LLM回复格式错误，找不到JSON")
@@ -226,17 +441,15 @@ class SurveyEvaluationWorkflow:
     def extract_urls_from_file(self, json_file: Path) -> List[str]:
         """从JSON文件中直接用正则表达式提取所有http/https开头的URL"""
         try:
-            with open(json_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                response = data.get('response', '')
-                
-                # 直接用正则表达式提取所有http/https开头的URL
-                url_pattern = r'(https?://[^\s\)\]\"\'>]+)'
-                urls = re.findall(url_pattern, response)
-                
-                # 去重，保持顺序
-                unique_urls = list(dict.fromkeys(urls))
-                return unique_urls
+            data = _load_json_file(json_file)
+            response = data.get('response', '')
+            
+            # 直接用正则表达式提取所有http/https开头的URL
+            urls = _URL_RE.findall(response)
+            
+            # 去重，保持顺序
+            unique_urls = list(dict.fromkeys(urls))
+            return unique_urls
                 
         except Exception as e:
             print(f"读取文件失败: {e}")
@@ -244,7 +457,6 @@ class SurveyEvaluationWorkflow:
     
     def fetch_url_contents(self, urls: List[str]) -> List[Dict]:
         """抓取URL内容，复用现有的缓存机制"""
-        from cache_utils import load_or_create_url_cache, get_or_create_id_for_url, save_url_cache
         from firecrawl import FirecrawlApp
         from config import FIRECRAWL_API_KEY
         from utils import retry_async
@@ -253,22 +465,18 @@ class SurveyEvaluationWorkflow:
         unique_urls = self._deduplicate_urls(urls)
         print(f"去重后: {len(unique_urls)} 个URL")
         
-        # 加载URL缓存
-        url_cache = load_or_create_url_cache(self.cache_file)
-        
         # 创建缓存目录
         cache_dir = Path("raw_texts")
         cache_dir.mkdir(exist_ok=True)
         
-        contents = []
+        app = FirecrawlApp(api_key=FIRECRAWL_API_KEY) if FIRECRAWL_API_KEY else None
 
         @retry_async(attempts=2) 
         def _load_with_firecrawl(url: str) -> str | None:
-            if not FIRECRAWL_API_KEY:
+            if app is None:
                 return None
-            app = FirecrawlApp(api_key=FIRECRAWL_API_KEY)
             try:
-                res = app.scrape_url(url, formats=['markdown'], timeout=60*10e3)
+                res = app.scrape_url(url, formats=['markdown'], timeout=600_000)  # firecrawl 的超时单位为毫秒
                 return res.markdown
             except Exception as e:
                 if "Failed to scrape URL" in str(e) and "All scraping engines failed" in str(e):
@@ -277,87 +485,143 @@ class SurveyEvaluationWorkflow:
                 else:
                     raise e
         
-        for i, url in enumerate(unique_urls, 1):
-            print(f"处理URL {i}/{len(unique_urls)}: {url[:80]}...")
+        def _fetch(url: str, random_id: str) -> Dict:
+            content = None
+            try:
+                content = _load_with_firecrawl(url)
+            except Exception as e:
+                print(f"  ✗ 抓取失败: {url[:80]}: {e}")
             
+            if content:
+                # 保存到缓存
+                if self._page_cache is not None:
+                    self._page_cache.put(url, content)
+                    print(f"  ✓ 抓取成功，已缓存: {self._page_cache.db_file}")
+                else:
+                    (cache_dir / f"{random_id}.txt").write_text(content, encoding='utf-8')
+                    print(f"  ✓ 抓取成功，已缓存: {random_id}.txt")
+                return {
+                    'url': url,
+                    'status': 'success', 
+                    'content': content,
+                    'random_id': random_id,
+                    'from_cache': False
+                }
+            print(f"  ✗ 抓取失败: 无法获取内容: {url[:80]}")
+            return {
+                'url': url,
+                'status': 'failed',
+                'content': '',
+                'random_id': random_id,
+                'from_cache': False,
+                'error': '抓取失败'
+            }
+        
+        # 先区分命中缓存与需要抓取的URL，只有未命中的才发起网络请求
+        results_by_url: Dict[str, Dict] = {}
+        misses: List[Tuple[str, str]] = []
+        # 一次scandir列出已有的txt缓存，代替逐个URL调用exists()
+        legacy_ids = self._list_legacy_cache_ids(cache_dir) if self.use_cache else set()
+        for url in unique_urls:
             try:
                 # 获取或创建URL对应的随机ID
-                random_id, url_cache = get_or_create_id_for_url(url, url_cache)
-                cache_file_path = cache_dir / f"{random_id}.txt"
+                random_id = self._get_url_id(url)
                 
                 # 检查缓存
-                if self.use_cache and cache_file_path.exists():
-                    print(f"  ✓ 使用缓存: {random_id}.txt")
-                    content = cache_file_path.read_text(encoding='utf-8')
-                    contents.append({
+                content = self._read_cached_page(url, random_id, cache_dir, legacy_ids) if self.use_cache else None
+                if content is not None:
+                    results_by_url[url] = {
                         'url': url,
                         'status': 'success',
                         'content': content,
                         'random_id': random_id,
                         'from_cache': True
-                    })
+                    }
                 else:
-                    # 抓取内容
-                    print(f"  → 抓取新内容...")
-                    content = None
-                    
-                    try:
-                        content = _load_with_firecrawl(url)
-                    except Exception as e:
-                        print(f"  ✗ 抓取失败: {e}")
-                    
-                    if content:
-                        # 保存到缓存
-                        cache_file_path.write_text(content, encoding='utf-8')
-                        print(f"  ✓ 抓取成功，已缓存: {random_id}.txt")
-                        contents.append({
-                            'url': url,
-                            'status': 'success', 
-                            'content': content,
-                            'random_id': random_id,
-                            'from_cache': False
-                        })
-                    else:
-                        print(f"  ✗ 抓取失败: 无法获取内容")
-                        contents.append({
-                            'url': url,
-                            'status': 'failed',
-                            'content': '',
-                            'random_id': random_id,
-                            'from_cache': False,
-                            'error': '抓取失败'
-                        })
-                        
+                    misses.append((url, random_id))
             except Exception as e:
                 print(f"  ✗ 处理失败: {e}")
-                contents.append({
+                results_by_url[url] = {
                     'url': url,
                     'status': 'failed',
                     'content': '',
                     'random_id': '',
                     'from_cache': False,
                     'error': str(e)
-                })
+                }
+        
+        print(f"缓存命中 {len(unique_urls) - len(misses)} 个，需抓取 {len(misses)} 个URL")
+        
+        # 每次抓取都是网络往返占主导的阻塞调用，使用线程池并发发起请求
+        if misses:
+            with ThreadPoolExecutor(max_workers=min(self.fetch_workers, len(misses))) as executor:
+                futures = {
+                    executor.submit(_fetch, url, random_id): url
+                    for url, random_id in misses
+                }
+                for future in as_completed(futures):
+                    results_by_url[futures[future]] = future.result()
+        
+        # 按去重后的URL顺序组装结果
+        contents = [results_by_url[url] for url in unique_urls]
         
         # 保存URL缓存
-        save_url_cache(url_cache, self.cache_file)
+        self._save_url_cache()
         
         success_count = len([c for c in contents if c['status'] == 'success'])
         print(f"完成URL内容抓取: 成功 {success_count}/{len(unique_urls)} 个")
         
         return contents
     
+    @staticmethod
+    def _list_legacy_cache_ids(cache_dir: Path) -> Set[str]:
+        """列出旧版txt缓存目录中已存在的随机ID"""
+        with os.scandir(cache_dir) as it:
+            return {entry.name[:-4] for entry in it if entry.name.endswith('.txt')}
+    
+    def _read_cached_page(self, url: str, random_id: str, cache_dir: Path, legacy_ids: Set[str]) -> Optional[str]:
+        """
+        读取缓存的网页内容，未命中时返回None
+        
+        SQLite缓存未命中但存在旧版txt缓存时，读取后迁移到数据库中
+        """
+        if self._page_cache is not None:
+            content = self._page_cache.get(url)
+            if content is not None:
+                return content
+        
+        if random_id not in legacy_ids:
+            return None
+        
+        content = (cache_dir / f"{random_id}.txt").read_text(encoding='utf-8')
+        if self._page_cache is not None:
+            self._page_cache.put(url, content)
+        return content
+    
+    def _get_url_id(self, url: str) -> str:
+        """线程安全地获取或创建URL对应的随机ID"""
+        with self._url_cache_lock:
+            if self._url_cache is None:
+                self._url_cache = load_or_create_url_cache(self.cache_file)
+            random_id, self._url_cache = get_or_create_id_for_url(url, self._url_cache)
+            return random_id
+    
+    def _save_url_cache(self):
+        """线程安全地保存URL缓存"""
+        with self._url_cache_lock:
+            if self._url_cache is not None:
+                save_url_cache(self._url_cache, self.cache_file)
+    
     def _deduplicate_urls(self, urls: List[str]) -> List[str]:
         """基于标准化URL去重"""
-        unique_urls = []
-        seen_normalized = set()
+        # 单次遍历：以标准化URL为键保留首次出现的URL，dict保持插入顺序
+        first_by_normalized = {}
         duplicates = 0
         
         for url in urls:
             normalized = normalize_url(url)
-            if normalized not in seen_normalized:
-                unique_urls.append(url)
-                seen_normalized.add(normalized)
+            if normalized not in first_by_normalized:
+                first_by_normalized[normalized] = url
             else:
                 duplicates += 1
                 # 使用原始URL进行日志记录，避免过长
@@ -367,93 +631,37 @@ class SurveyEvaluationWorkflow:
         if duplicates > 0:
             print(f"去重完成: 移除了 {duplicates} 个重复URL")
         
-        return unique_urls
+        return list(first_by_normalized.values())
     
     def analyze_papers(self, contents: List[Dict], arxiv_id: str) -> List[Dict]:
         """使用LLM分析学术论文"""
         print("使用LLM分析学术论文...")
         
-        llm = build_llm()
+        llm = self.llm
         papers = []
         
         # 只处理成功获取内容的URL
-        valid_contents = [c for c in contents if c['status'] == 'success' and c['content']]
+        # 网页内容在这里统一截断一次，批量分析失败回退到逐个分析时直接复用
+        valid_contents = [
+            {'url': c['url'], 'content': c['content'][:PAGE_CONTENT_LIMIT]}
+            for c in contents if c['status'] == 'success' and c['content']
+        ]
         
-        for i, item in enumerate(valid_contents, 1):
-            print(f"分析 {i}/{len(valid_contents)}: {item['url'][:80]}...")
+        batch_size = self.analyze_batch_size
+        for start in range(0, len(valid_contents), batch_size):
+            batch = valid_contents[start:start + batch_size]
             
-            try:
-                # 构造分析prompt
-                prompt = f"""
-请分析以下网页内容，判断它是否是一篇学术论文。如果是学术论文，请提取标题和作者信息。
-
-网页URL: {item['url']}
-
-网页内容:
-{item['content'][:8000]}
-
-请以JSON格式回复，包含以下字段：
-- is_academic_paper: true/false
-- title: 论文标题（如果是学术论文）
-- authors: 作者列表（如果是学术论文）
-- reason: 判断理由
-
-示例:
-{{
-    "is_academic_paper": true,
-    "title": "Deep Learning for Natural Language Processing",
-    "authors": ["John Smith", "Jane Doe"],
-    "reason": "包含摘要、关键词、实验结果等学术论文特征"
-}}
-"""
-                retry = True
-                while retry:
-                    try:
-                        response = llm.invoke(prompt)
-                        result_text = response.content
-                        retry = False
-                    except Exception as e:
-                        if "reach token limit" in str(e):
-                            print(f"[!] 速率墙，重试... {e}")
-                            retry = True
-                        else:
-                            print(f"[!] 其他错误，不重试... {e}")
-                            retry = False
-                            raise e
-                
-                # 解析LLM回复
-                try:
-                    # 提取JSON部分
-                    json_start = result_text.find('{')
-                    json_end = result_text.rfind('}') + 1
-                    if json_start >= 0 and json_end > json_start:
-                        json_text = result_text[json_start:json_end]
-                        analysis = json.loads(json_text)
-                    else:
-                        analysis = {"is_academic_paper": False, "reason": "LLM回复格式错误"}
-                        
-                except json.JSONDecodeError:
-                    analysis = {"is_academic_paper": False, "reason": "JSON解析失败"}
-                
-                papers.append({
-                    'url': item['url'],
-                    'is_academic_paper': analysis.get('is_academic_paper', False),
-                    'title': analysis.get('title', ''),
-                    'authors': ', '.join(analysis.get('authors', [])) if analysis.get('authors') else '',
-                    'reason': analysis.get('reason', ''),
-                    'llm_response': result_text
-                })
-                
-            except Exception as e:
-                print(f"分析失败: {item['url']} - {e}")
-                papers.append({
-                    'url': item['url'],
-                    'is_academic_paper': False,
-                    'title': '',
-                    'authors': '',
-                    'reason': f'分析错误: {e}',
-                    'llm_response': ''
-                })
+            if len(batch) > 1:
+                print(f"批量分析 {start + 1}-{start + len(batch)}/{len(valid_contents)}...")
+                batch_papers = self._analyze_batch(llm, batch)
+                if batch_papers is not None:
+                    papers.extend(batch_papers)
+                    continue
+                print("  批量分析结果无效，回退到逐个分析")
+            
+            for i, item in enumerate(batch, start + 1):
+                print(f"分析 {i}/{len(valid_contents)}: {item['url'][:80]}...")
+                papers.append(self._analyze_single(llm, item))
         
         # 只返回被识别为学术论文的结果
         academic_papers = [p for p in papers if p['is_academic_paper']]
@@ -461,6 +669,122 @@ class SurveyEvaluationWorkflow:
         
         return papers  # 返回所有分析结果以便调试
     
+    def _analyze_single(self, llm, item: Dict) -> Dict:
+        """使用LLM分析单个网页是否为学术论文"""
+        try:
+            # 构造分析prompt
+            prompt = PROMPT_ANALYZE_PAPER.format_map({'url': item['url'], 'content': item['content']})
+            result_text, analysis = self._invoke_llm_cached(llm, prompt, _parse_paper_analysis)
+            if analysis is None:
+                analysis = {"is_academic_paper": False, "reason": "LLM回复格式错误或JSON解析失败"}
+            
+            return self._build_paper_record(item['url'], analysis, result_text)
+            
+        except Exception as e:
+            print(f"分析失败: {item['url']} - {e}")
+            return {
+                'url': item['url'],
+                'is_academic_paper': False,
+                'title': '',
+                'authors': '',
+                'reason': f'分析错误: {e}',
+                'llm_response': ''
+            }
+    
+    def _analyze_batch(self, llm, batch: List[Dict]) -> Optional[List[Dict]]:
+        """
+        将多个网页合并到一个prompt中分析，共享说明和示例部分的token并减少请求往返
+        
+        Returns:
+            与batch顺序一致的分析结果；调用失败、解析失败或数量不一致时返回None
+        """
+        documents = "\n\n".join(
+            PROMPT_BATCH_DOCUMENT.format_map({'index': i, 'url': item['url'], 'content': item['content']})
+            for i, item in enumerate(batch, 1)
+        )
+        prompt = PROMPT_ANALYZE_PAPERS_BATCH.format_map({'count': len(batch), 'documents': documents})
+        
+        def _parse(text: str) -> Optional[List[Dict]]:
+            # 取回复中第一个数量匹配且元素均为对象的JSON数组
+            return next(
+                (candidate for candidate in _extract_jsons(text, '[')
+                 if len(candidate) == len(batch)
+                 and all(isinstance(analysis, dict) for analysis in candidate)),
+                None
+            )
+        
+        try:
+            result_text, analyses = self._invoke_llm_cached(llm, prompt, _parse)
+        except Exception as e:
+            print(f"  批量分析失败: {e}")
+            return None
+        
+        if analyses is None:
+            return None
+        
+        return [
+            self._build_paper_record(item['url'], analysis, result_text)
+            for item, analysis in zip(batch, analyses)
+        ]
+    
+    @staticmethod
+    def _build_paper_record(url: str, analysis: Dict, result_text: str) -> Dict:
+        """将LLM的分析结果整理为论文记录"""
+        return {
+            'url': url,
+            'is_academic_paper': analysis.get('is_academic_paper', False),
+            'title': analysis.get('title', ''),
+            'authors': ', '.join(analysis.get('authors', [])) if analysis.get('authors') else '',
+            'reason': analysis.get('reason', ''),
+            'llm_response': result_text
+        }
+    
+    def _invoke_llm_cached(self, llm, prompt: str, parse: Callable[[str], object]) -> Tuple[str, object]:
+        """
+        调用LLM并将回复缓存到 raw_texts/llm/<hash>.json，重复运行时跳过相同prompt的推理
+        
+        缓存键由模型名和完整prompt计算，prompt中已包含URL和截断后的网页内容。
+        回复用 parse 解析，返回 (回复文本, 解析结果)；parse 返回None表示回复无效，
+        无效回复不写入缓存，已缓存但解析失败的回复会重新调用
+        """
+        model_name = getattr(llm, 'model_name', '') or ''
+        key = hashlib.sha256(f"{model_name}\n{prompt}".encode('utf-8')).hexdigest()
+        cache_path = Path("raw_texts") / "llm" / f"{key}.json"
+        
+        if self.use_cache and cache_path.exists():
+            try:
+                with open(cache_path, 'r', encoding='utf-8') as f:
+                    cached_text = json.load(f)['response']
+                parsed = parse(cached_text)
+                if parsed is not None:
+                    return cached_text, parsed
+            except (OSError, ValueError, KeyError):
+                pass
+        
+        @retry_on_token_limit()
+        def _invoke() -> str:
+            with llm_rate_limiter.reserve(estimate_tokens(prompt)):
+                return llm.invoke(prompt).content
+        
+        try:
+            result_text = _invoke()
+        except Exception as e:
+            print(f"[!] LLM调用失败，不再重试... {e}")
+            raise
+        
+        parsed = parse(result_text)
+        if parsed is None:
+            return result_text, None
+        
+        # 先写临时文件再原子替换，中途崩溃不会留下写了一半的缓存文件
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'model': model_name, 'response': result_text}, f, ensure_ascii=False)
+        os.replace(tmp_path, cache_path)
+        
+        return result_text, parsed
+    
     def load_ground_truth(self, arxiv_id: str) -> List[Dict]:
         """加载ground truth数据"""
         ground_truth_file = self.ground_truth_dir / f"{arxiv_id}.jsonl"
@@ -470,15 +794,13 @@ class SurveyEvaluationWorkflow:
         
         papers = []
         try:
-            with open(ground_truth_file, 'r', encoding='utf-8') as f:
-                for line in f:
-                    data = json.loads(line.strip())
-                    papers.append({
-                        'bib_id': data.get('bib_id', ''),
-                        'title': data.get('title', ''),
-                        'author': data.get('author', ''),
-                        'meta_info': data.get('meta_info', {})
-                    })
+            for data in _load_jsonl_file(ground_truth_file):
+                papers.append({
+                    'bib_id': data.get('bib_id', ''),
+                    'title': data.get('title', ''),
+                    'author': data.get('author', ''),
+                    'meta_info': data.get('meta_info', {})
+                })
         except Exception as e:
             print(f"读取ground truth失败: {e}")
             return []
@@ -490,23 +812,24 @@ class SurveyEvaluationWorkflow:
         """计算precision和recall"""
         print("计算Precision和Recall...")
         
-        # 提取预测的学术论文标题（标准化）
-        predicted_titles = set()
-        for paper in predicted_papers:
-            if paper['is_academic_paper'] and paper['title']:
-                title = self.normalize_title(paper['title'])
-                if title:
-                    predicted_titles.add(title)
+        # 提取预测的学术论文标题（标准化），空标题标准化后为空串，从集合中剔除
+        predicted_titles = {
+            _normalize_title(paper['title'])
+            for paper in predicted_papers
+            if paper['is_academic_paper'] and paper['title']
+        }
+        predicted_titles.discard('')
         
         # 提取ground truth论文标题（标准化）
-        ground_truth_titles = set()
-        for paper in ground_truth_papers:
-            title = self.normalize_title(paper['title'])
-            if title:
-                ground_truth_titles.add(title)
+        ground_truth_titles = {
+            _normalize_title(paper['title'])
+            for paper in ground_truth_papers
+            if paper['title']
+        }
+        ground_truth_titles.discard('')
         
-        # 计算交集
-        intersection = predicted_titles & ground_truth_titles
+        # 计算交集（模糊匹配模式下为一对一的近似匹配，两侧命中的标题可能不同）
+        matched_predicted, intersection = self.match_titles(predicted_titles, ground_truth_titles)
         
         # 计算precision和recall
         precision = len(intersection) / len(predicted_titles) if predicted_titles else 0
@@ -523,7 +846,8 @@ class SurveyEvaluationWorkflow:
             'f1_score': f1,
             'predicted_titles': list(predicted_titles),
             'ground_truth_titles': list(ground_truth_titles),
-            'intersection_titles': list(intersection)
+            'intersection_titles': list(intersection),
+            'matched_predicted_titles': list(matched_predicted)
         }
         
         print(f"Precision: {precision:.3f} ({len(intersection)}/{len(predicted_titles)})")
@@ -532,17 +856,42 @@ class SurveyEvaluationWorkflow:
         
         return evaluation
     
+    def match_titles(self, predicted_titles: Set[str], ground_truth_titles: Set[str]) -> Tuple[Set[str], Set[str]]:
+        """
+        匹配预测标题与ground truth标题，返回 (被命中的预测标题集合, 被命中的ground truth标题集合)，
+        两个集合大小相同
+        
+        默认为精确匹配；启用模糊匹配时用rapidfuzz计算相似度矩阵，
+        按分数从高到低做一对一贪心匹配，分数不低于阈值即视为命中
+        """
+        if not self.fuzzy_match or not predicted_titles or not ground_truth_titles:
+            intersection = predicted_titles & ground_truth_titles
+            return intersection, intersection
+        
+        pred_list = sorted(predicted_titles)
+        gt_list = sorted(ground_truth_titles)
+        scores = rf_process.cdist(pred_list, gt_list, scorer=fuzz.token_sort_ratio,
+                                  score_cutoff=self.fuzzy_threshold, dtype=np.uint8, workers=-1)
+        
+        # 在numpy中筛出达到阈值的格子并排序（分数降序，同分按行、列升序），Python循环只遍历命中项
+        rows, cols = np.nonzero(scores >= self.fuzzy_threshold)
+        order = np.lexsort((cols, rows, -scores[rows, cols].astype(np.int16)))
+        
+        matched_pred = set()
+        matched_gt = set()
+        for i, j in zip(rows[order].tolist(), cols[order].tolist()):
+            if pred_list[i] in matched_pred or gt_list[j] in matched_gt:
+                continue
+            matched_pred.add(pred_list[i])
+            matched_gt.add(gt_list[j])
+        
+        return matched_pred, matched_gt
+    
     def normalize_title(self, title: str) -> str:
         """标准化论文标题用于比较"""
         if not title:
             return ""
-        
-        # 转换为小写，移除标点和多余空格
-        import string
-        title = title.lower()
-        title = title.translate(str.maketrans('', '', string.punctuation))
-        title = ' '.join(title.split())
-        return title
+        return _normalize_title(title)
     
     def save_single_file_results(self, arxiv_id: str, urls: List[str], contents: List[Dict], 
                                 predicted_papers: List[Dict], ground_truth_papers: List[Dict], 
@@ -553,21 +902,17 @@ class SurveyEvaluationWorkflow:
         
         # 保存URL列表（no-url模式下为空）
         if urls:
-            df_urls = pd.DataFrame([{'url': url} for url in urls])
-            save_csv(df_urls, file_result_dir / "extracted_urls.csv")
+            save_rows_csv([{'url': url} for url in urls], file_result_dir / "extracted_urls.csv")
         
         # 保存URL内容获取结果（no-url模式下为空）
         if contents:
-            df_contents = pd.DataFrame(contents)
-            save_csv(df_contents, file_result_dir / "url_contents.csv")
+            save_rows_csv(contents, file_result_dir / "url_contents.csv")
         
         # 保存论文分析结果
-        df_predicted = pd.DataFrame(predicted_papers)
-        save_csv(df_predicted, file_result_dir / "predicted_papers.csv")
+        save_rows_csv(predicted_papers, file_result_dir / "predicted_papers.csv")
         
         # 保存ground truth
-        df_ground_truth = pd.DataFrame(ground_truth_papers)
-        save_csv(df_ground_truth, file_result_dir / "ground_truth_papers.csv")
+        save_rows_csv(ground_truth_papers, file_result_dir / "ground_truth_papers.csv")
         
         # 保存评估结果
         evaluation_summary = {
@@ -580,31 +925,35 @@ class SurveyEvaluationWorkflow:
             'f1_score': evaluation['f1_score']
         }
         
-        df_evaluation = pd.DataFrame([evaluation_summary])
-        save_csv(df_evaluation, file_result_dir / "evaluation_summary.csv")
+        save_rows_csv([evaluation_summary], file_result_dir / "evaluation_summary.csv")
         
         # 保存详细的标题比较
         title_comparison = []
+        predicted_set = set(evaluation['predicted_titles'])
+        matched_predicted_set = set(evaluation['matched_predicted_titles'])
+        intersection_set = set(evaluation['intersection_titles'])
         
-        # 预测的标题
+        # 预测的标题（按预测侧的命中集合标记）
         for title in evaluation['predicted_titles']:
             title_comparison.append({
                 'title': title,
                 'type': 'predicted',
-                'in_intersection': title in evaluation['intersection_titles']
+                'in_intersection': title in matched_predicted_set
             })
         
-        # Ground truth标题
+        # Ground truth标题（按ground truth侧的命中集合标记）
         for title in evaluation['ground_truth_titles']:
-            if title not in evaluation['predicted_titles']:
+            if title not in predicted_set:
                 title_comparison.append({
                     'title': title,
                     'type': 'ground_truth',
-                    'in_intersection': title in evaluation['intersection_titles']
+                    'in_intersection': title in intersection_set
                 })
         
-        df_titles = pd.DataFrame(title_comparison)
-        save_csv(df_titles, file_result_dir / "title_comparison.csv")
+        if self.parquet:
+            save_parquet(pd.DataFrame(title_comparison), file_result_dir / "title_comparison.parquet")
+        else:
+            save_rows_csv(title_comparison, file_result_dir / "title_comparison.csv")
     
     def generate_final_report(self):
         """生成最终统计报告"""
@@ -615,34 +964,27 @@ class SurveyEvaluationWorkflow:
             return
         
         # 创建汇总表格
-        summary_data = []
-        for result in self.evaluation_results:
-            summary_data.append({
-                'arxiv_id': result['arxiv_id'],
-                'predicted_count': result['predicted_count'],
-                'ground_truth_count': result['ground_truth_count'],
-                'intersection_count': result['intersection_count'],
-                'precision': result['precision'],
-                'recall': result['recall'],
-                'f1_score': result['f1_score']
-            })
-        
-        df_summary = pd.DataFrame(summary_data)
-        save_csv(df_summary, self.result_dir / "final_evaluation_summary.csv")
+        df_summary = pd.DataFrame(self.evaluation_results, columns=[
+            'arxiv_id', 'predicted_count', 'ground_truth_count', 'intersection_count',
+            'precision', 'recall', 'f1_score'
+        ])
+        save_csv(df_summary, self.result_dir / "final_evaluation_summary.csv", for_excel=True)
         
         # 计算总体统计
-        total_predicted = sum(r['predicted_count'] for r in self.evaluation_results)
-        total_ground_truth = sum(r['ground_truth_count'] for r in self.evaluation_results)
-        total_intersection = sum(r['intersection_count'] for r in self.evaluation_results)
+        totals = df_summary[['predicted_count', 'ground_truth_count', 'intersection_count']].sum()
+        total_predicted = int(totals['predicted_count'])
+        total_ground_truth = int(totals['ground_truth_count'])
+        total_intersection = int(totals['intersection_count'])
         
         overall_precision = total_intersection / total_predicted if total_predicted > 0 else 0
         overall_recall = total_intersection / total_ground_truth if total_ground_truth > 0 else 0
         overall_f1 = 2 * overall_precision * overall_recall / (overall_precision + overall_recall) if (overall_precision + overall_recall) > 0 else 0
         
         # 计算平均指标
-        avg_precision = sum(r['precision'] for r in self.evaluation_results) / len(self.evaluation_results)
-        avg_recall = sum(r['recall'] for r in self.evaluation_results) / len(self.evaluation_results)
-        avg_f1 = sum(r['f1_score'] for r in self.evaluation_results) / len(self.evaluation_results)
+        averages = df_summary[['precision', 'recall', 'f1_score']].mean()
+        avg_precision = float(averages['precision'])
+        avg_recall = float(averages['recall'])
+        avg_f1 = float(averages['f1_score'])
         
         # 保存总体统计
         overall_stats = {
@@ -659,7 +1001,7 @@ class SurveyEvaluationWorkflow:
         }
         
         df_overall = pd.DataFrame([overall_stats])
-        save_csv(df_overall, self.result_dir / "overall_statistics.csv")
+        save_csv(df_overall, self.result_dir / "overall_statistics.csv", for_excel=True)
         
         # 打印统计结果
         print(f"\n{'='*80}")
@@ -696,6 +1038,20 @@ def parse_args():
                         help='不进行URL提取和抓取，直接从文件内容中提取参考文献论文题目')
     parser.add_argument('--cache-file', default="url_cache.csv",
                         help='URL缓存文件路径')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='同时处理的文件数（默认: 8）')
+    parser.add_argument('--fetch-workers', type=int, default=16,
+                        help='单个文件内并发抓取的URL数（默认: 16）')
+    parser.add_argument('--analyze-batch-size', type=int, default=1,
+                        help='每次LLM请求合并分析的网页数，大于1时启用批量分析（默认: 1）')
+    parser.add_argument('--fuzzy-match', action='store_true',
+                        help='使用rapidfuzz进行标题模糊匹配（默认精确匹配）')
+    parser.add_argument('--fuzzy-threshold', type=float, default=90,
+                        help='模糊匹配的相似度阈值，0-100（默认: 90）')
+    parser.add_argument('--legacy-cache', action='store_true',
+                        help='网页内容沿用 raw_texts/<id>.txt 缓存，而不是 raw_texts.sqlite 数据库')
+    parser.add_argument('--parquet', action='store_true',
+                        help='标题比较结果保存为 title_comparison.parquet（需要pyarrow）')
     
     return parser.parse_args()
 
@@ -711,6 +1067,13 @@ def main():
     use_cache = not args.no_cache  # no_cache为True时，use_cache为False
     no_url = args.no_url
     cache_file = args.cache_file
+    concurrency = args.concurrency
+    fetch_workers = args.fetch_workers
+    analyze_batch_size = args.analyze_batch_size
+    fuzzy_match = args.fuzzy_match
+    fuzzy_threshold = args.fuzzy_threshold
+    legacy_cache = args.legacy_cache
+    parquet = args.parquet
     
     # 检查必要目录
     if not Path(survey_dir).exists():
@@ -729,11 +1092,20 @@ def main():
     print(f"  使用缓存: {use_cache}")
     print(f"  no-url模式: {no_url}")
     print(f"  缓存文件: {cache_file}")
+    print(f"  网页缓存: {'raw_texts/*.txt' if legacy_cache else 'raw_texts.sqlite'}")
+    print(f"  并发数: {concurrency}")
+    print(f"  URL抓取并发数: {fetch_workers}")
+    print(f"  LLM批量分析大小: {analyze_batch_size}")
+    print(f"  标题模糊匹配: {fuzzy_match}" + (f" (阈值: {fuzzy_threshold})" if fuzzy_match else ""))
     print()
     
     # 开始处理
     workflow = SurveyEvaluationWorkflow(survey_dir, ground_truth_dir, result_dir, 
-                                       use_cache=use_cache, no_url=no_url, cache_file=cache_file)
+                                       use_cache=use_cache, no_url=no_url, cache_file=cache_file,
+                                       concurrency=concurrency, fetch_workers=fetch_workers,
+                                       analyze_batch_size=analyze_batch_size,
+                                       fuzzy_match=fuzzy_match, fuzzy_threshold=fuzzy_threshold,
+                                       legacy_cache=legacy_cache, parquet=parquet)
     workflow.process_all_files()
 
 
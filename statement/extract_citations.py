@@ -17,7 +17,6 @@
 从报告中提取所有引用表述及其链接，基于URL生成唯一的随机ID
 输出—— citations.csv : ID, statement, url
 """
-import json
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
@@ -27,62 +26,60 @@ import pandas as pd
 from langchain_core.prompts import PromptTemplate
 
 from statement.prompts import PROMPT_EXTRACT_CITATIONS
-from utils import build_llm, save_csv, post_process_json, load_text, split_text_by_headers
-from cache_utils import load_or_create_url_cache, get_or_create_id_for_url, save_url_cache
+from statement.llm_cache import cached_batch, model_id, prompt_version
+from utils import build_llm, save_csv, parse_llm_json, load_text, split_text_by_headers
+from cache_utils import url_cache_lock, load_or_create_url_cache, get_or_create_id_for_url, save_url_cache
 
+_PROMPT_VERSION = prompt_version(PROMPT_EXTRACT_CITATIONS)
 
-def extract_citations_from_text(report_text: str, out_csv: str | Path, cache_file: str = "url_cache.csv") -> pd.DataFrame:
-    """主函数：接受文本内容 → 分块 → 调用 LLM → 基于URL生成ID → 输出 CSV"""
+
+def extract_citations_from_text(
+    report_text: str,
+    out_csv: str | Path,
+    cache_file: str = "url_cache.csv",
+    text_blocks: list[str] | None = None,
+) -> pd.DataFrame:
+    """主函数：接受文本内容 → 分块 → 调用 LLM → 基于URL生成ID → 输出 CSV；text_blocks 为调用方已分好的块"""
     # 将文本分块处理
-    text_blocks = split_text_by_headers(report_text)
+    if text_blocks is None:
+        text_blocks = split_text_by_headers(report_text)
     print(f"[✓] 文本已分割为 {len(text_blocks)} 个块")
     
     llm = build_llm()
     system_prompt = PromptTemplate.from_template(PROMPT_EXTRACT_CITATIONS)
     chain = system_prompt | llm
 
-    # 加载URL缓存
-    url_cache = load_or_create_url_cache(cache_file)
+    ids, statements, urls = [], [], []
     
-    all_rows = []
+    # 各文本块相互独立，并发调用LLM；结果按块的顺序处理
+    print(f"[→] 并发处理 {len(text_blocks)} 个块...")
+    # 回复在缓存前先解析，无法解析的回复不会被缓存，重跑时会重新调用
+    results = cached_batch(chain, [{"report": block} for block in text_blocks],
+                           _PROMPT_VERSION, model_id(llm), validate=parse_llm_json)
     
-    # 对每个文本块进行处理
-    for i, block in enumerate(text_blocks, 1):
-        print(f"[→] 处理第 {i}/{len(text_blocks)} 块...")
-        
-        retry = True
-        while retry:
-            try:
-                raw = chain.invoke({"report": block})
-                post_processed = post_process_json(raw.content)
-                data = json.loads(post_processed)
-
-                for item in data:
-                    url = item["url"].strip()
-                    statement = item["statement"].strip()
-                    
-                    # 基于URL获取或创建随机ID
-                    random_id, url_cache = get_or_create_id_for_url(url, url_cache)
-                    
-                    all_rows.append({
-                        "ID": random_id,
-                        "statement": statement,
-                        "url": url,
-                    })
-                
-                retry = False
-            except Exception as e:
-                if "reach token limit" in str(e):
-                    print(f"[!] 速率墙，重试... {e}")
-                    retry = True
-                else:
-                    print(f"[!] 其他错误，不重试... {e}")
-                    retry = False
+    for i, data in enumerate(results, 1):
+        if isinstance(data, Exception):
+            print(f"[!] 第 {i} 块调用或解析失败，不重试... {data}")
+            continue
+        try:
+            for item in data:
+                url = item["url"].strip()
+                statement = item["statement"].strip()
+                urls.append(url)
+                statements.append(statement)
+        except Exception as e:
+            print(f"[!] 第 {i} 块解析失败... {e}")
 
-    # 保存URL缓存
-    save_url_cache(url_cache, cache_file)
+    # 基于URL获取或创建随机ID；URL缓存文件在多个报告并发处理时共享，读-改-写需持锁
+    with url_cache_lock:
+        url_cache = load_or_create_url_cache(cache_file)
+        for url in urls:
+            random_id, url_cache = get_or_create_id_for_url(url, url_cache)
+            ids.append(random_id)
+        save_url_cache(url_cache, cache_file)
 
-    df = pd.DataFrame(all_rows)
+    # 按列构造 DataFrame，空结果时也保留列名
+    df = pd.DataFrame({"ID": ids, "statement": statements, "url": urls})
     save_csv(df, out_csv)
     print(f"[✓] 从 {len(text_blocks)} 个文本块中提取到 {len(df)} 条引用表述")
     return df
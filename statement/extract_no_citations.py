@@ -17,7 +17,6 @@
 从报告中提取所有没有引用支撑的事实性表述
 输出—— no_citations.csv : ID, statement
 """
-import json
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
@@ -27,18 +26,23 @@ import pandas as pd
 from langchain_core.prompts import PromptTemplate
 
 from statement.prompts import PROMPT_EXTRACT_NO_CITATIONS
-from utils import build_llm, save_csv, post_process_json, load_text, split_text_by_headers
+from statement.llm_cache import cached_batch, model_id, prompt_version
+from utils import build_llm, save_csv, parse_llm_json, load_text, split_text_by_headers
+
+_PROMPT_VERSION = prompt_version(PROMPT_EXTRACT_NO_CITATIONS)
 
 
 def extract_no_citations_from_text(
     report_text: str,
     df_citations: pd.DataFrame,
-    out_csv: str | Path = "no_citations.csv"
+    out_csv: str | Path = "no_citations.csv",
+    text_blocks: list[str] | None = None,
 ) -> pd.DataFrame:
-    """主函数：接受文本内容 → 分块 → 调用 LLM → 提取无引用表述 → 输出 CSV"""
+    """主函数：接受文本内容 → 分块 → 调用 LLM → 提取无引用表述 → 输出 CSV；text_blocks 为调用方已分好的块"""
     
     # 将文本分块处理
-    text_blocks = split_text_by_headers(report_text)
+    if text_blocks is None:
+        text_blocks = split_text_by_headers(report_text)
     print(f"[✓] 文本已分割为 {len(text_blocks)} 个块")
     
     llm = build_llm()
@@ -50,41 +54,28 @@ def extract_no_citations_from_text(
     system_prompt = PromptTemplate.from_template(PROMPT_EXTRACT_NO_CITATIONS)
     chain = system_prompt | llm
 
-    all_rows = []
-    statement_counter = 1
+    statements = []
     
-    # 对每个文本块进行处理
-    for i, block in enumerate(text_blocks, 1):
-        print(f"[→] 处理第 {i}/{len(text_blocks)} 块...")
-        
-        retry = True
-        while retry:
-            try:
-                raw = chain.invoke({
-                    "report": block,
-                    "cited_statements": cited_statements_text
-                })
-                post_processed = post_process_json(raw.content)
-                data = json.loads(post_processed)
-
-                for item in data:
-                    statement = item["statement"].strip()
-                    all_rows.append({
-                        "ID": f"NC_{statement_counter:03d}",  # NC = No Citation
-                        "statement": statement,
-                    })
-                    statement_counter += 1
-
-                retry = False
-            except Exception as e:
-                if "reach token limit" in str(e):
-                    print(f"[!] 速率墙，重试... {e}")
-                    retry = True
-                else:
-                    print(f"[!] 其他错误，不重试... {e}")
-                    retry = False
+    # 各文本块相互独立，并发调用LLM；结果按块的顺序处理，保证编号确定
+    print(f"[→] 并发处理 {len(text_blocks)} 个块...")
+    # 回复在缓存前先解析，无法解析的回复不会被缓存，重跑时会重新调用
+    results = cached_batch(chain, [
+        {"report": block, "cited_statements": cited_statements_text}
+        for block in text_blocks
+    ], _PROMPT_VERSION, model_id(llm), validate=parse_llm_json)
+    
+    for i, data in enumerate(results, 1):
+        if isinstance(data, Exception):
+            print(f"[!] 第 {i} 块调用或解析失败，不重试... {data}")
+            continue
+        try:
+            statements.extend(item["statement"].strip() for item in data)
+        except Exception as e:
+            print(f"[!] 第 {i} 块解析失败... {e}")
 
-    df = pd.DataFrame(all_rows)
+    # 按块顺序一次性编号：NC_001, NC_002, ...（NC = No Citation）
+    df = pd.DataFrame({"statement": statements})
+    df.insert(0, "ID", "NC_" + pd.Series(range(1, len(df) + 1), dtype="int64").astype(str).str.zfill(3))
     save_csv(df, out_csv)
     print(f"[✓] 从 {len(text_blocks)} 个文本块中提取到 {len(df)} 条无引用表述")
     return df
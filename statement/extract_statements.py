@@ -0,0 +1,98 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+步骤 1 + 1b（合并）：一次 LLM 调用同时提取引用表述和无引用表述
+每个文本块只发送一次，输出与分步提取相同的两个 CSV
+输出—— citations.csv : ID, statement, url
+      no_citations.csv : ID, statement
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+import pandas as pd
+
+from langchain_core.prompts import PromptTemplate
+
+from statement.prompts import PROMPT_EXTRACT_BOTH
+from statement.llm_cache import cached_batch, model_id, prompt_version
+from utils import build_llm, save_csv, parse_llm_json, split_text_by_headers
+from cache_utils import url_cache_lock, load_or_create_url_cache, get_or_create_id_for_url, save_url_cache
+
+_PROMPT_VERSION = prompt_version(PROMPT_EXTRACT_BOTH)
+
+
+def extract_statements_from_text(
+    report_text: str,
+    out_cit_csv: str | Path = "citations.csv",
+    out_noc_csv: str | Path = "no_citations.csv",
+    cache_file: str = "url_cache.csv",
+    text_blocks: list[str] | None = None,
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """主函数：接受文本内容 → 分块 → 每块调用一次 LLM → 拆分为两类表述 → 输出两个 CSV；text_blocks 为调用方已分好的块"""
+    # 将文本分块处理
+    if text_blocks is None:
+        text_blocks = split_text_by_headers(report_text)
+    print(f"[✓] 文本已分割为 {len(text_blocks)} 个块")
+
+    llm = build_llm()
+    system_prompt = PromptTemplate.from_template(PROMPT_EXTRACT_BOTH)
+    chain = system_prompt | llm
+
+    ids, statements, urls = [], [], []
+    uncited_statements = []
+
+    # 各文本块相互独立，并发调用LLM；结果按块的顺序处理，保证编号确定
+    print(f"[→] 并发处理 {len(text_blocks)} 个块...")
+    # 回复在缓存前先解析，无法解析的回复不会被缓存，重跑时会重新调用
+    results = cached_batch(chain, [{"report": block} for block in text_blocks],
+                           _PROMPT_VERSION, model_id(llm),
+                           validate=lambda raw: parse_llm_json(raw, start_chars="{"))
+
+    for i, data in enumerate(results, 1):
+        if isinstance(data, Exception):
+            print(f"[!] 第 {i} 块调用或解析失败，不重试... {data}")
+            continue
+        try:
+            for item in data.get("cited", []):
+                url = item["url"].strip()
+                statement = item["statement"].strip()
+                urls.append(url)
+                statements.append(statement)
+
+            uncited_statements.extend(item["statement"].strip() for item in data.get("uncited", []))
+        except Exception as e:
+            print(f"[!] 第 {i} 块解析失败... {e}")
+
+    # 基于URL获取或创建随机ID；URL缓存文件在多个报告并发处理时共享，读-改-写需持锁
+    with url_cache_lock:
+        url_cache = load_or_create_url_cache(cache_file)
+        for url in urls:
+            random_id, url_cache = get_or_create_id_for_url(url, url_cache)
+            ids.append(random_id)
+        save_url_cache(url_cache, cache_file)
+
+    # 按列构造 DataFrame，空结果时也保留列名
+    df_citations = pd.DataFrame({"ID": ids, "statement": statements, "url": urls})
+    # 按块顺序一次性编号：NC_001, NC_002, ...（NC = No Citation）
+    df_no_citations = pd.DataFrame({"statement": uncited_statements})
+    df_no_citations.insert(
+        0, "ID", "NC_" + pd.Series(range(1, len(df_no_citations) + 1), dtype="int64").astype(str).str.zfill(3)
+    )
+    save_csv(df_citations, out_cit_csv)
+    save_csv(df_no_citations, out_noc_csv)
+    print(f"[✓] 从 {len(text_blocks)} 个文本块中提取到 {len(df_citations)} 条引用表述、"
+          f"{len(df_no_citations)} 条无引用表述")
+    return df_citations, df_no_citations
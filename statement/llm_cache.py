@@ -0,0 +1,181 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+LLM 回复缓存
+以 sha256(模型, 提示词版本, 输入) 为键，将回复保存到 SQLite（默认 llm_cache.db），
+重复运行流水线时相同的请求直接复用已有回复，跳过 LLM 调用
+"""
+import hashlib
+import json
+import sqlite3
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config import LLM_CACHE_FILE
+from utils import batch_invoke_with_retry
+
+
+class LLMCache:
+    """基于SQLite（WAL模式）的LLM回复缓存，单个连接由锁保护，可在多个线程间共享"""
+
+    def __init__(self, db_file: str | Path = "llm_cache.db"):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_file), isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache("
+            "key TEXT PRIMARY KEY, model TEXT, prompt_version TEXT, response TEXT, ts INTEGER)"
+        )
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, model: str, prompt_version: str, response: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache(key, model, prompt_version, response, ts) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, model, prompt_version, response, int(time.time())),
+            )
+
+
+_cache: LLMCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> LLMCache | None:
+    """返回全局缓存实例；LLM_CACHE_FILE 为空时禁用缓存"""
+    global _cache
+    if not LLM_CACHE_FILE:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = LLMCache(LLM_CACHE_FILE)
+    return _cache
+
+
+def prompt_version(template: str) -> str:
+    """由提示词模板内容生成版本号，修改模板后旧缓存自动失效"""
+    return hashlib.sha256(template.encode("utf-8")).hexdigest()[:16]
+
+
+def model_id(llm) -> str:
+    """取模型名（Azure 下为 deployment 名），作为缓存键的一部分"""
+    return getattr(llm, "model_name", None) or getattr(llm, "deployment_name", None) or ""
+
+
+def make_key(model: str, version: str, inputs: dict) -> str:
+    payload = json.dumps({"m": model, "p": version, "i": inputs}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _identity(response: str) -> str:
+    return response
+
+
+def cached_call(
+    model: str,
+    version: str,
+    inputs: dict,
+    call: Callable[[], str],
+    validate: Callable[[str], Any] | None = None,
+) -> Any:
+    """
+    命中缓存时直接返回，否则执行 call() 并缓存其返回的文本；call 抛出的异常不会被缓存
+
+    validate 用于校验/解析回复文本（如 parse_llm_json），返回其结果；只有校验通过的回复才写入缓存，
+    校验失败的异常直接抛出。已缓存的回复校验失败时视为未命中，重新调用
+    """
+    validate = validate or _identity
+    cache = get_cache()
+    if cache is None:
+        return validate(call())
+    key = make_key(model, version, inputs)
+    response = cache.get(key)
+    if response is not None:
+        try:
+            return validate(response)
+        except Exception:
+            pass
+    response = call()
+    result = validate(response)
+    cache.set(key, model, version, response)
+    return result
+
+
+def cached_invoke(chain, inputs: dict, version: str, model: str) -> str:
+    """带缓存的 chain.invoke，返回回复文本"""
+    return cached_call(model, version, inputs, lambda: chain.invoke(inputs).content)
+
+
+def cached_batch(
+    chain,
+    inputs: list[dict],
+    version: str,
+    model: str,
+    validate: Callable[[str], Any] | None = None,
+) -> list:
+    """
+    带缓存的批量调用：只对未命中的输入调用 batch_invoke_with_retry
+
+    validate 的含义同 cached_call：只缓存校验通过的回复，已缓存但校验失败的回复重新调用
+
+    Returns:
+        与 inputs 顺序一致的列表，成功为 validate(回复文本)（未指定 validate 时为回复文本），
+        调用或校验失败为异常对象
+    """
+    validate = validate or _identity
+    cache = get_cache()
+    keys = [make_key(model, version, item) for item in inputs]
+    results: list = [None] * len(inputs)
+    misses = []
+    for i, key in enumerate(keys):
+        response = cache.get(key) if cache is not None else None
+        if response is not None:
+            try:
+                results[i] = validate(response)
+                continue
+            except Exception:
+                pass
+        misses.append(i)
+    if not misses:
+        return results
+
+    if len(misses) < len(inputs):
+        print(f"[✓] LLM缓存命中 {len(inputs) - len(misses)}/{len(inputs)}")
+
+    outputs = batch_invoke_with_retry(chain, [inputs[i] for i in misses])
+    for i, output in zip(misses, outputs):
+        if isinstance(output, Exception):
+            results[i] = output
+            continue
+        try:
+            results[i] = validate(output.content)
+        except Exception as e:
+            results[i] = e
+            continue
+        if cache is not None:
+            cache.set(keys[i], model, version, output.content)
+    return results
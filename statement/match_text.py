@@ -16,78 +16,194 @@
 步骤 3：从原文中找到与表述最相近的句子
 输出—— matched.csv : ID, statement, source_sentence, url
 """
+import math
 import re
 import sys
+import threading
+from collections import Counter
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import pandas as pd
 from langchain_core.prompts import PromptTemplate
 from tqdm import tqdm
 
 from statement.prompts import PROMPT_MATCH_SENTENCE
-from utils import build_llm, save_csv
+from config import LLM_MAX_CONCURRENCY, MATCH_CONTEXT_CHARS
+from statement.llm_cache import cached_call, model_id, prompt_version
+from utils import build_llm, save_csv, retry_on_token_limit, llm_rate_limiter, estimate_tokens, CsvCheckpoint
 
 MAX_SOURCE_LEN = 262144
+_FIELDS = ["ID", "statement", "source_sentence", "url"]
+_PROMPT_VERSION = prompt_version(PROMPT_MATCH_SENTENCE)
+_SENT_RE = re.compile(r"(?<=[。？！.!?])\s*")
+# 英文按词、中文按单字切分
+_TOKEN_RE = re.compile(r"[a-z0-9]+|[\u4e00-\u9fff]")
+_BM25_K1 = 1.5
+_BM25_B = 0.75
 
 def _split_sentences(text: str) -> list[str]:
-    """简易句子切分（中英文混合）"""
-    return re.split(r"(?<=[。？！.!?])\s*", text)
+    """简易句子切分（中英文混合），去掉空串"""
+    return [s for s in _SENT_RE.split(text) if s]
+
+
+def _tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _build_index(source_text: str) -> tuple[list[str], list[Counter], list[int], dict[str, float]]:
+    """对原文按句建立 BM25 索引：句子列表、各句词频、各句长度、idf"""
+    sentences = _split_sentences(source_text)
+    tfs = [Counter(_tokenize(s)) for s in sentences]
+    lengths = [sum(tf.values()) for tf in tfs]
+    df = Counter(term for tf in tfs for term in tf)
+    n = len(sentences)
+    idf = {term: math.log(1 + (n - cnt + 0.5) / (cnt + 0.5)) for term, cnt in df.items()}
+    return sentences, tfs, lengths, idf
+
+
+def rank_passages(statement: str, source_text: str, k: int = 8, window: int = 3, index=None) -> str:
+    """
+    用 BM25 在原文中检索与表述最相关的 k 个句子，各自向前后扩展 window 句，
+    按原文顺序拼接返回；不相邻的段落之间以空行分隔。index 为 _build_index 的预建结果
+    """
+    sentences, tfs, lengths, idf = index or _build_index(source_text)
+    if not sentences:
+        return source_text
+
+    query = set(_tokenize(statement)) & idf.keys()
+    avg_len = (sum(lengths) / len(lengths)) or 1.0
+    scores = []
+    for i, (tf, length) in enumerate(zip(tfs, lengths)):
+        norm = _BM25_K1 * (1 - _BM25_B + _BM25_B * length / avg_len)
+        score = sum(idf[t] * tf[t] * (_BM25_K1 + 1) / (tf[t] + norm) for t in query if t in tf)
+        scores.append((score, i))
+    top = [i for score, i in sorted(scores, reverse=True)[:k] if score > 0]
+
+    keep = sorted({j for i in top for j in range(max(0, i - window), min(len(sentences), i + window + 1))})
+    if not keep:
+        return source_text[:MATCH_CONTEXT_CHARS]
 
+    parts, prev = [], None
+    for j in keep:
+        if prev is not None:
+            parts.append(" " if j == prev + 1 else "\n\n")
+        parts.append(sentences[j])
+        prev = j
+    return "".join(parts)
 
-def find_best_sentence(statement: str, source_text: str, llm) -> str:
+
+def _needs_retrieval(source_text: str) -> bool:
+    return bool(MATCH_CONTEXT_CHARS) and len(source_text) > MATCH_CONTEXT_CHARS
+
+
+def _select_context(statement: str, source_text: str, index=None) -> str:
+    """原文较短时原样发送，较长时只发送检索出的相关段落"""
+    if _needs_retrieval(source_text):
+        source_text = rank_passages(statement, source_text, index=index)
+    return source_text[:MAX_SOURCE_LEN]
+
+
+def find_best_sentence(statement: str, source_text: str, llm, index=None) -> str:
     """调用 LLM 选最匹配的句子"""
     prompt = PromptTemplate.from_template(PROMPT_MATCH_SENTENCE)
     chain = prompt | llm
-    resp = chain.invoke({"statement": statement, "source_text": source_text[:MAX_SOURCE_LEN]})
-    return resp.content.strip()
+    inputs = {"statement": statement, "source_text": _select_context(statement, source_text, index)}
+
+    def _call() -> str:
+        with llm_rate_limiter.reserve(estimate_tokens(*inputs.values())):
+            return chain.invoke(inputs).content
+
+    return cached_call(model_id(llm), _PROMPT_VERSION, inputs, _call).strip()
+
+
+# 触发 token 速率限制时指数退避重试，其他异常直接抛出
+_find_best_sentence_with_retry = retry_on_token_limit(attempts=10)(find_best_sentence)
+
+
+class _SourceStore:
+    """
+    按 ID 缓存原文及其检索索引：同一 URL 的多条引用共享一个 ID，
+    文件只读一次、索引只建一次；每个 ID 一把锁，保证并发时只有一个线程负责加载
+    """
+
+    def __init__(self, raw_dir: Path):
+        self._raw_dir = raw_dir
+        self._lock = threading.Lock()
+        self._id_locks: dict = {}
+        self._entries: dict = {}
+
+    def get(self, rid) -> tuple[str, tuple | None] | None:
+        """返回 (原文, 索引)，文件不存在时返回 None；原文较短不需要检索时索引为 None"""
+        with self._lock:
+            id_lock = self._id_locks.setdefault(rid, threading.Lock())
+        with id_lock:
+            if rid not in self._entries:
+                self._entries[rid] = self._load(rid)
+            return self._entries[rid]
+
+    def _load(self, rid) -> tuple[str, tuple | None] | None:
+        source_path = self._raw_dir / f"{rid}.txt"
+        if not source_path.exists():
+            print(f"警告：文件 {source_path} 不存在，跳过")
+            return None
+        source_text = source_path.read_text(encoding="utf-8")
+        index = _build_index(source_text) if _needs_retrieval(source_text) else None
+        return source_text, index
+
+
+def _match_row(row: dict, sources: _SourceStore, llm) -> dict | None:
+    """处理单条引用表述：取出原文并调用 LLM 匹配句子，失败时返回 None"""
+    entry = sources.get(row["ID"])
+    if entry is None:
+        return None
+    source_text, index = entry
+
+    try:
+        best = _find_best_sentence_with_retry(row["statement"], source_text, llm, index)
+    except Exception as e:
+        print(f"[!] 调用失败，不再重试... {e}")
+        return None
+
+    return {
+        "ID": row["ID"],
+        "statement": row["statement"],
+        "source_sentence": best,
+        "url": row["url"],
+    }
 
 
 def match_sentences(
     df_citations: pd.DataFrame,
     raw_dir: str | Path = "raw_texts",
     out_csv: str | Path = "matched.csv",
+    max_workers: int = LLM_MAX_CONCURRENCY,
 ) -> pd.DataFrame:
     llm = build_llm()
-    rows = []
+    records = df_citations.to_dict("records")
+    sources = _SourceStore(Path(raw_dir))
 
-    for _, row in tqdm(df_citations.iterrows(), total=len(df_citations), desc="Matching"):
-        random_id = row.ID
-        source_path = Path(raw_dir) / f"{random_id}.txt"
-        
-        if not source_path.exists():
-            print(f"警告：文件 {source_path} 不存在，跳过")
-            continue
-            
-        source_text = source_path.read_text(encoding="utf-8")
+    # 每完成一行立即写入检查点；中断后重跑时跳过已完成的行
+    checkpoint = CsvCheckpoint.for_output(out_csv, _FIELDS)
+    results, pending = checkpoint.resume(records, ["ID", "statement"])
+
+    # 各行相互独立，并发调用 LLM；结果按原顺序写回
+    with checkpoint, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_match_row, records[i], sources, llm): i
+            for i in pending
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Matching"):
+            row = future.result()
+            results[futures[future]] = row
+            if row is not None:
+                checkpoint.write(row)
+
+    rows = [row for row in results if row is not None]
 
-        retry = True
-        fail = False
-        while retry:
-            try:
-                best = find_best_sentence(row.statement, source_text, llm)
-                retry = False
-            except Exception as e:
-                if "reach token limit" in str(e):
-                    print(f"[!] 速率墙，重试... {e}")
-                    retry = True
-                else:
-                    print(f"[!] 其他错误，不重试... {e}")
-                    retry = False
-                    fail = True
-
-        if fail:
-            continue
-
-        rows.append(
-            {
-                "ID": row.ID,
-                "statement": row.statement,
-                "source_sentence": best,
-                "url": row.url,
-            }
-        )
-
-    df_match = pd.DataFrame(rows)
+    df_match = pd.DataFrame(rows, columns=_FIELDS)
     save_csv(df_match, out_csv)
-    return df_match
\ No newline at end of file
+    checkpoint.remove()
+    return df_match
@@ -58,6 +58,34 @@ Already cited statements:
 {cited_statements}
 """
 
+# 1+2) 一次调用同时抽取"带引用的表述"和"无引用的表述"
+PROMPT_EXTRACT_BOTH = """
+You are given a research report delimited by triple backticks.
+Extract two kinds of statements from it in a single pass.
+
+A) Cited statements: every statement that cites an external source (e.g. has a URL, DOI, or explicit citation marker), paired with the corresponding URL.
+   Each item has two keys:
+     "statement": the single‑sentence claim, stripped of leading/trailing whitespace
+     "url": the canonical URL that supports that claim
+   If a citation contains multiple URLs, duplicate the statement for each URL.
+
+B) Uncited statements: factual claims or statements that:
+1. Make specific assertions about facts, data, or events
+2. Are NOT among the cited statements of part A
+3. Could potentially be verified through external sources
+4. Are NOT common knowledge or widely accepted facts
+   Exclude opinions, analysis, subjective interpretations, common knowledge, and vague or general statements.
+   Each item has one key:
+     "statement": the factual claim that lacks citation support
+
+Return a single JSON object with two keys:
+  "cited": the JSON list of part A
+  "uncited": the JSON list of part B
+ONLY return valid JSON.
+Report:
+```{report}```
+"""
+
 # 3) 从网页原文里找到与表述最相近的句子
 PROMPT_MATCH_SENTENCE = """
 You are provided with
@@ -18,7 +18,11 @@
 输出—— raw_texts/<随机ID>.txt: 抓取的原文内容
 """
 import logging
+import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
@@ -34,6 +38,19 @@ from utils import retry_async
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
+# 抓取是网络 I/O 密集型，线程池并发即可掩盖单个请求的延迟
+SCRAPE_MAX_WORKERS = 16
+
+# 并发处理多个报告时，引用同一 URL 的报告会拿到同一个 ID、写同一个文件：
+# 每个输出文件一把锁，保证同一文件同时只有一个线程在抓取
+_path_locks: dict = {}
+_path_locks_guard = threading.Lock()
+
+
+def _path_lock(out_path: Path) -> threading.Lock:
+    with _path_locks_guard:
+        return _path_locks.setdefault(str(out_path.resolve()), threading.Lock())
+
 
 @retry_async(attempts=2)
 def _load_with_langchain(url: str) -> str | None:
@@ -41,12 +58,18 @@ def _load_with_langchain(url: str) -> str | None:
     docs = loader.load()
     return docs[0].page_content if docs else None
 
+@lru_cache(maxsize=1)
+def _get_firecrawl_app() -> FirecrawlApp:
+    """所有抓取线程共享同一个 FirecrawlApp 实例，不再为每个 URL 新建客户端"""
+    return FirecrawlApp(api_key=FIRECRAWL_API_KEY)
+
+
 @retry_async(attempts=2)
 def _load_with_firecrawl(url: str) -> str | None:
     if not FIRECRAWL_API_KEY:
         return None
-    app = FirecrawlApp(api_key=FIRECRAWL_API_KEY)
-    res = app.scrape_url(url, formats=['markdown'], timeout=60*10e3)
+    app = _get_firecrawl_app()
+    res = app.scrape_url(url, formats=['markdown'], timeout=600_000)  # firecrawl 的超时单位为毫秒
     return res.markdown
 
 @retry_async(attempts=2)
@@ -58,38 +81,64 @@ def _load_with_link_reader(url: str) -> str | None:
             "plugin_id": "39",
             "tool_name": "LinkReaderPlugin",
             "ak": "p3cKOCWxtrQ9yhyM63SCQpWgxcsF8VNi"
-        }
+        },
+        timeout=60,
     )
     return res.text
 
 
-def scrape_all(df_citations, out_dir: str | Path = "raw_texts"):
-    """抓取所有链接内容，基于随机ID避免重复抓取"""
+def _scrape_one(random_id, url: str, out_path: Path) -> None:
+    """抓取单个链接并写入 out_path；firecrawl 失败时退回 LangChain"""
+    with _path_lock(out_path):
+        # 等锁期间其他报告可能已抓取完同一 ID
+        if out_path.exists():
+            logger.info(f"[✓] ID {random_id} 已缓存，跳过抓取")
+            return
+        _scrape_locked(random_id, url, out_path)
+
+
+def _scrape_locked(random_id, url: str, out_path: Path) -> None:
+    logger.info(f"[→] 抓取 ID {random_id}: {url}")
+
+    # 抓取内容
+    try:
+        text = _load_with_firecrawl(url)
+        if not text:
+            text = _load_with_langchain(url)
+    except Exception as e:
+        logger.error(f"[!] 抓取失败: {url}，错误: {e}")
+        text = None
+
+    if text:
+        # 先写临时文件再原子替换，match_sentences 不会读到写了一半的文件
+        tmp_path = out_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(text, encoding="utf-8")
+        os.replace(tmp_path, out_path)
+        logger.info(f"[✓] 成功抓取: {random_id}.txt")
+    else:
+        logger.warning(f"[!] 抓取失败: {url}")
+
+
+def scrape_all(df_citations, out_dir: str | Path = "raw_texts", max_workers: int = SCRAPE_MAX_WORKERS):
+    """抓取所有链接内容，基于随机ID避免重复抓取；各链接在线程池中并发抓取"""
     Path(out_dir).mkdir(exist_ok=True)
 
-    for _, row in tqdm(df_citations.iterrows(), total=len(df_citations), desc="Scraping"):
-        random_id = row.ID
-        url = row.url
+    # 同一 URL 共享一个 ID，每个 ID 只抓一次；已缓存的文件直接跳过
+    pending: dict = {}
+    for random_id, url in zip(df_citations["ID"], df_citations["url"]):
         out_path = Path(out_dir) / f"{random_id}.txt"
-        
-        # 如果文件已存在，跳过抓取
-        if out_path.exists():
+        if random_id in pending or out_path.exists():
             logger.info(f"[✓] ID {random_id} 已缓存，跳过抓取")
             continue
+        pending[random_id] = (url, out_path)
+
+    if not pending:
+        return
 
-        logger.info(f"[→] 抓取 ID {random_id}: {url}")
-        
-        # 抓取内容
-        try:
-            text = _load_with_firecrawl(url)
-            if not text:
-                text = _load_with_langchain(url)
-        except Exception as e:
-            logger.error(f"[!] 抓取失败: {url}，错误: {e}")
-            text = None
-
-        if text:
-            out_path.write_text(text, encoding="utf-8")
-            logger.info(f"[✓] 成功抓取: {random_id}.txt")
-        else:
-            logger.warning(f"[!] 抓取失败: {url}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(_scrape_one, random_id, url, out_path)
+            for random_id, (url, out_path) in pending.items()
+        ]
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Scraping"):
+            future.result()
@@ -17,65 +17,90 @@
 输出—— final.csv : ID, statement, source_sentence, url, match, reason
 终端额外打印 Match Rate (%)
 """
-import json
 import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
 import pandas as pd
 from langchain_core.prompts import PromptTemplate
 from tqdm import tqdm
 
 from statement.prompts import PROMPT_VERIFY_ALIGNMENT
-from utils import build_llm, save_csv, post_process_json
+from config import LLM_MAX_CONCURRENCY
+from statement.llm_cache import cached_call, model_id, prompt_version
+from utils import build_llm, save_csv, parse_llm_json, retry_on_token_limit, llm_rate_limiter, estimate_tokens, CsvCheckpoint
+
+_PROMPT_VERSION = prompt_version(PROMPT_VERIFY_ALIGNMENT)
+_FIELDS = ["ID", "statement", "source_sentence", "url", "match", "reason"]
 
 
 def check_alignment(statement: str, source_sentence: str, llm) -> tuple[bool, str]:
     prompt = PromptTemplate.from_template(PROMPT_VERIFY_ALIGNMENT)
-    resp = (prompt | llm).invoke(
-        {"statement": statement, "source_sentence": source_sentence}
-    )
-    post_processed = post_process_json(resp.content)
-    data = json.loads(post_processed)
+    inputs = {"statement": statement, "source_sentence": source_sentence}
+
+    def _call() -> str:
+        with llm_rate_limiter.reserve(estimate_tokens(statement, source_sentence)):
+            return (prompt | llm).invoke(inputs).content
+
+    # 回复在缓存前先解析，无法解析的回复不会被缓存
+    data = cached_call(model_id(llm), _PROMPT_VERSION, inputs, _call, validate=parse_llm_json)
     return bool(data["match"]), data["reason"]
 
 
-def verify(df_match: pd.DataFrame, out_csv: str | Path = "final.csv") -> float:
-    llm = build_llm()
-    results = []
-
-    for _, row in tqdm(df_match.iterrows(), total=len(df_match), desc="Verifying"):
-        retry = True
-        fail = False
-        while retry:
-            try:
-                match, reason = check_alignment(row.statement, row.source_sentence, llm)
-                retry = False
-            except Exception as e:                
-                if "reach token limit" in str(e):
-                    print(f"[!] 速率墙，重试... {e}")
-                    retry = True
-                else:
-                    print(f"[!] 其他错误，不重试... {e}")
-                    retry = False
-                    fail = True
-
-        if fail:
-            continue
-
-        results.append(
-            {
-                "ID": row.ID,
-                "statement": row.statement,
-                "source_sentence": row.source_sentence,
-                "url": row.url,
-                "match": match,
-                "reason": reason,
-            }
+# 触发 token 速率限制时指数退避重试，其他异常直接抛出
+_check_alignment_with_retry = retry_on_token_limit(attempts=10)(check_alignment)
+
+
+def _verify_row(row: dict, llm) -> dict | None:
+    """校对单条匹配结果，失败时返回 None"""
+    try:
+        match, reason = _check_alignment_with_retry(
+            row["statement"], row["source_sentence"], llm
         )
+    except Exception as e:
+        print(f"[!] 调用失败，不再重试... {e}")
+        return None
+
+    return {
+        "ID": row["ID"],
+        "statement": row["statement"],
+        "source_sentence": row["source_sentence"],
+        "url": row["url"],
+        "match": match,
+        "reason": reason,
+    }
+
+
+def verify(df_match: pd.DataFrame, out_csv: str | Path = "final.csv", max_workers: int = LLM_MAX_CONCURRENCY) -> float:
+    llm = build_llm()
+    records = df_match.to_dict("records")
+
+    # 每完成一行立即写入检查点；中断后重跑时跳过已完成的行（CSV 读回的 match 为字符串）
+    checkpoint = CsvCheckpoint.for_output(out_csv, _FIELDS)
+    ordered, pending = checkpoint.resume(records, ["ID", "statement", "source_sentence"])
+    for row in ordered:
+        if row is not None:
+            row["match"] = row["match"] == "True"
+
+    # 各行相互独立，并发调用 LLM；结果按原顺序写回
+    with checkpoint, ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(_verify_row, records[i], llm): i
+            for i in pending
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Verifying"):
+            row = future.result()
+            ordered[futures[future]] = row
+            if row is not None:
+                checkpoint.write(row)
+
+    results = [row for row in ordered if row is not None]
 
-    df_final = pd.DataFrame(results)
-    save_csv(df_final, out_csv)
+    df_final = pd.DataFrame(results, columns=_FIELDS)
+    save_csv(df_final, out_csv, for_excel=True)
+    checkpoint.remove()
 
     # 计算详细统计
     if not df_final.empty:
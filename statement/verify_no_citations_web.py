@@ -24,6 +24,7 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent))
 
+import numpy as np
 import pandas as pd
 from tqdm import tqdm
 from collections import Counter
@@ -31,56 +32,57 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 
 from statement.prompts import PROMPT_WEB_VERIFY_STATEMENT
-from utils import build_web_llms, save_csv, post_process_json
+from statement.llm_cache import cached_call, prompt_version
+from utils import build_web_llms, save_csv, post_process_json, parse_llm_json, CsvCheckpoint
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_PROMPT_VERSION = prompt_version(PROMPT_WEB_VERIFY_STATEMENT)
+_FIELDS = ["ID", "statement", "llm_model", "attempt", "decision", "reason", "success"]
 
-def verify_statement_with_web_llm(statement: str, web_llm_client, attempt: int = 1) -> tuple[bool, str]:
-    """使用联网LLM验证单个表述"""
+
+def _require_response(response: str) -> str:
+    """空回复（HTTP 200 但没有内容）视为失败，不写入缓存"""
+    if not response or not response.strip():
+        raise ValueError("联网LLM返回空回复")
+    return response
+
+
+def fetch_web_llm_response(statement: str, web_llm_client, attempt: int = 1) -> str:
+    """调用联网LLM验证单个表述，返回原始回复文本（只做网络 I/O，不解析）"""
     messages = [
         {
             "role": "user", 
             "content": PROMPT_WEB_VERIFY_STATEMENT.format(statement=statement)
         }
     ]
-    
+    # 同一表述的多次投票需要相互独立，因此把模型名和 attempt 都放进缓存键
+    return cached_call(
+        web_llm_client.model_name, _PROMPT_VERSION,
+        {"statement": statement, "attempt": attempt},
+        lambda: web_llm_client.generate(messages),
+        validate=_require_response,
+    )
+
+
+def parse_verification_response(response: str, attempt: int = 1) -> tuple[bool, str]:
+    """解析联网LLM的回复，返回 (decision, reason)"""
     try:
-        response = web_llm_client.generate(messages)
-        
-        # 处理JSON响应 - 增强错误处理
-        post_processed = post_process_json(response)
-        
-        # 尝试多种方式处理JSON
+        # 处理JSON响应：整体解析失败时从第一个 '{' 起用 raw_decode 解析一次，最后才用正则兜底
         try:
-            # 首先尝试直接解析
-            data = json.loads(post_processed)
+            data = parse_llm_json(response, start_chars="{")
         except json.JSONDecodeError as e:
-            logger.warning(f"直接JSON解析失败 (尝试 {attempt}): {e}")
+            logger.warning(f"JSON解析失败 (尝试 {attempt}): {e}")
             
-            # 尝试清理响应内容
-            cleaned_response = clean_json_response(post_processed)
-            try:
-                data = json.loads(cleaned_response)
-                logger.info(f"清理后JSON解析成功 (尝试 {attempt})")
-            except json.JSONDecodeError as e2:
-                logger.error(f"清理后JSON解析仍失败 (尝试 {attempt}): {e2}")
+            # 作为最后的尝试，使用正则表达式提取JSON
+            data = extract_json_with_regex(post_process_json(response))
+            if data:
+                logger.info(f"正则表达式提取JSON成功 (尝试 {attempt})")
+            else:
+                logger.error(f"正则表达式提取也失败 (尝试 {attempt})")
                 logger.error(f"原始响应: {response[:200]}...")
-                logger.error(f"后处理响应: {post_processed[:200]}...")
-                logger.error(f"清理响应: {cleaned_response[:200]}...")
-                
-                # 作为最后的尝试，使用正则表达式提取JSON
-                try:
-                    extracted_data = extract_json_with_regex(post_processed)
-                    if extracted_data:
-                        data = extracted_data
-                        logger.info(f"正则表达式提取JSON成功 (尝试 {attempt})")
-                    else:
-                        raise ValueError("无法从响应中提取有效JSON")
-                except Exception as e3:
-                    logger.error(f"正则表达式提取也失败 (尝试 {attempt}): {e3}")
-                    return False, f"JSON解析失败: {str(e)}"
+                return False, f"JSON解析失败: {str(e)}"
         
         decision = data.get("decision", False)
         reason = data.get("reason", "无法判断")
@@ -96,32 +98,14 @@ def verify_statement_with_web_llm(statement: str, web_llm_client, attempt: int =
         return False, f"验证过程出错: {str(e)}"
 
 
-def clean_json_response(response: str) -> str:
-    """清理JSON响应内容"""
-    # 移除常见的前缀和后缀
-    response = response.strip()
-    
-    # 尝试找到JSON对象的开始和结束
-    start_idx = response.find('{')
-    if start_idx == -1:
-        return response
-    
-    # 找到第一个完整JSON对象的结束位置
-    brace_count = 0
-    end_idx = -1
-    for i in range(start_idx, len(response)):
-        if response[i] == '{':
-            brace_count += 1
-        elif response[i] == '}':
-            brace_count -= 1
-            if brace_count == 0:
-                end_idx = i + 1
-                break
-    
-    if end_idx > start_idx:
-        return response[start_idx:end_idx]
-    
-    return response
+def verify_statement_with_web_llm(statement: str, web_llm_client, attempt: int = 1) -> tuple[bool, str]:
+    """使用联网LLM验证单个表述"""
+    try:
+        response = fetch_web_llm_response(statement, web_llm_client, attempt)
+    except Exception as e:
+        logger.error(f"验证失败 (尝试 {attempt}): {e}")
+        return False, f"验证过程出错: {str(e)}"
+    return parse_verification_response(response, attempt)
 
 
 def extract_json_with_regex(response: str) -> dict:
@@ -144,31 +128,97 @@ def extract_json_with_regex(response: str) -> dict:
 
 
 def verify_single_statement_task(statement_id: str, statement: str, web_llm, llm_name: str, attempt: int) -> dict:
-    """单个验证任务，用于并发执行"""
+    """单个验证任务，用于并发执行：只负责网络请求，返回原始回复，解析交给主线程"""
+    task = {
+        "ID": statement_id,
+        "statement": statement,
+        "llm_model": llm_name,
+        "attempt": attempt,
+        "response": None,
+        "error": None,
+    }
     try:
-        decision, reason = verify_statement_with_web_llm(statement, web_llm, attempt)
-        
-        return {
-            "ID": statement_id,
-            "statement": statement,
-            "llm_model": llm_name,
-            "attempt": attempt,
-            "decision": decision,
-            "reason": reason,
-            "success": True
-        }
-        
+        task["response"] = fetch_web_llm_response(statement, web_llm, attempt)
     except Exception as e:
         logger.error(f"表述 {statement_id} 使用 {llm_name} 尝试 {attempt} 失败: {e}")
-        return {
-            "ID": statement_id,
-            "statement": statement,
-            "llm_model": llm_name,
-            "attempt": attempt,
-            "decision": False,
-            "reason": f"验证失败: {str(e)}",
-            "success": False
-        }
+        task["error"] = str(e)
+    return task
+
+
+def finalize_task_result(task: dict) -> dict:
+    """在主线程中解析任务的原始回复，生成一条验证结果"""
+    if task["error"] is not None:
+        decision, reason = False, f"验证过程出错: {task['error']}"
+    else:
+        decision, reason = parse_verification_response(task["response"], task["attempt"])
+    return {
+        "ID": task["ID"],
+        "statement": task["statement"],
+        "llm_model": task["llm_model"],
+        "attempt": task["attempt"],
+        "decision": decision,
+        "reason": reason,
+        "success": True
+    }
+
+
+def group_duplicate_statements(df_no_citations: pd.DataFrame) -> dict[str, list[tuple[str, str]]]:
+    """
+    按规范化后的表述文本（去首尾空白、小写）分组
+
+    Returns:
+        {代表ID: [(ID, statement), ...]}，代表ID为该组中首次出现的ID，按首次出现顺序排列
+    """
+    members: dict[str, list[tuple[str, str]]] = {}
+    rep_by_norm: dict[str, str] = {}
+    for statement_id, statement in zip(df_no_citations["ID"], df_no_citations["statement"]):
+        rep_id = rep_by_norm.setdefault(str(statement).strip().lower(), statement_id)
+        members.setdefault(rep_id, []).append((statement_id, statement))
+    return members
+
+
+def _to_bool(decision) -> bool:
+    """确保决策结果为布尔类型：字符串 true/True/正确/yes/1 -> True，其他类型按真值转换"""
+    if isinstance(decision, bool):
+        return decision
+    if isinstance(decision, str):
+        return decision.lower() in ['true', '正确', 'yes', '1']
+    return bool(decision)
+
+
+def aggregate_votes(df_verification: pd.DataFrame) -> pd.DataFrame:
+    """将逐次验证结果按表述ID聚合为投票统计：多数为最终结论，票数相同为平局"""
+    columns = ["ID", "statement", "true_votes", "false_votes", "total_votes",
+               "final_decision", "confidence", "reasons"]
+    if df_verification.empty:
+        return pd.DataFrame(columns=columns)
+    
+    grouped = df_verification.assign(
+        decision_bool=df_verification["decision"].map(_to_bool)
+    ).groupby("ID", sort=False)
+    
+    true_votes = grouped["decision_bool"].sum().astype(int)
+    total_votes = grouped["decision_bool"].count()
+    false_votes = total_votes - true_votes
+    
+    df_final = pd.DataFrame({
+        "statement": grouped["statement"].first(),
+        "true_votes": true_votes,
+        "false_votes": false_votes,
+        "total_votes": total_votes,
+    })
+    df_final["final_decision"] = np.select(
+        [false_votes > true_votes, true_votes > false_votes], ["错误", "正确"], "平局"
+    )
+    df_final["confidence"] = np.where(
+        df_final["final_decision"] == "平局",
+        0.5,
+        np.maximum(true_votes, false_votes) / total_votes.where(total_votes > 0, 1),
+    )
+    # 收集所有原因
+    df_final["reasons"] = grouped["reason"].agg("; ".join)
+    
+    return df_final.reset_index()[columns]
 
 
 def verify_no_citations_web(
@@ -181,37 +231,54 @@ def verify_no_citations_web(
     
     # 初始化两个联网LLM客户端
     web_llms = build_web_llms()
-    verification_results = []
+    
+    # 相同的表述（去首尾空白、忽略大小写）只验证一次，结果再分发给所有对应的ID
+    members = group_duplicate_statements(df_no_citations)
+    if len(members) < len(df_no_citations):
+        logger.info(f"去重后需验证 {len(members)}/{len(df_no_citations)} 个表述")
+    
+    # 每完成一个任务立即写入检查点；中断后重跑时跳过已完成的 (ID, 模型, attempt)。
+    # NC_ 编号按位置生成，no_citations.csv 重新生成后同一 ID 可能对应另一条表述，
+    # 因此只复用 ID 与表述都一致的行
+    checkpoint = CsvCheckpoint.for_output(verification_csv, _FIELDS)
+    verification_results = [
+        {**row, "attempt": int(row["attempt"]), "decision": _to_bool(row["decision"]),
+         "success": row["success"] == "True"}
+        for row in checkpoint.load()
+        if row["ID"] in members and row["statement"] == members[row["ID"]][0][1]
+    ]
+    done = {(row["ID"], row["llm_model"], row["attempt"]) for row in verification_results}
     
     # 准备所有验证任务
     tasks = []
-    for _, row in df_no_citations.iterrows():
-        statement_id = row.ID
-        statement = row.statement
+    for statement_id, group in members.items():
+        statement = group[0][1]
         
         # 为每个LLM创建3次验证任务
         for llm_idx, web_llm in enumerate(web_llms):
             llm_name = web_llm.model_name
             for attempt in range(1, 4):  # 1, 2, 3
-                tasks.append((statement_id, statement, web_llm, llm_name, attempt))
+                if (statement_id, llm_name, attempt) not in done:
+                    tasks.append((statement_id, statement, web_llm, llm_name, attempt))
     
     total_tasks = len(tasks)
-    logger.info(f"开始并发验证 {len(df_no_citations)} 个表述，共 {total_tasks} 个验证任务")
+    logger.info(f"开始并发验证 {len(members)} 个表述，共 {total_tasks} 个验证任务")
     
     # 使用线程池执行并发验证
     start_time = time.time()
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+    with checkpoint, ThreadPoolExecutor(max_workers=max_workers) as executor:
         # 提交所有任务
         future_to_task = {
             executor.submit(verify_single_statement_task, *task): task 
             for task in tasks
         }
         
-        # 收集结果
+        # 收集结果：工作线程只做网络请求，回复在主线程中解析，线程不会被解析工作占用
         with tqdm(total=total_tasks, desc="并发验证中") as pbar:
             for future in as_completed(future_to_task):
-                result = future.result()
+                result = finalize_task_result(future.result())
                 verification_results.append(result)
+                checkpoint.write(result)
                 
                 # 更新进度条
                 pbar.set_postfix({
@@ -225,68 +292,23 @@ def verify_no_citations_web(
     end_time = time.time()
     logger.info(f"并发验证完成，耗时 {end_time - start_time:.2f} 秒")
     
+    # 将代表表述的验证结果分发给所有重复的ID
+    verification_results = [
+        {**result, "ID": member_id, "statement": member_statement}
+        for result in verification_results
+        for member_id, member_statement in members[result["ID"]]
+    ]
+    
     # 保存详细验证结果
     df_verification = pd.DataFrame(verification_results)
     save_csv(df_verification, verification_csv)
+    checkpoint.remove()
     
-    # 计算每个表述的投票结果
-    final_results = []
-    
-    for statement_id in df_verification['ID'].unique():
-        statement_data = df_verification[df_verification['ID'] == statement_id]
-        
-        if statement_data.empty:
-            continue
-            
-        statement = statement_data.iloc[0]['statement']
-        
-        # 统计投票结果
-        decisions = statement_data['decision'].tolist()
-        # 确保决策结果为布尔类型，处理可能的字符串值
-        boolean_decisions = []
-        for decision in decisions:
-            if isinstance(decision, bool):
-                boolean_decisions.append(decision)
-            elif isinstance(decision, str):
-                # 字符串转布尔：true/True/正确 -> True，其他 -> False
-                boolean_decisions.append(decision.lower() in ['true', '正确', 'yes', '1'])
-            else:
-                # 其他类型转布尔
-                boolean_decisions.append(bool(decision))
-        
-        true_votes = sum(boolean_decisions)
-        false_votes = len(boolean_decisions) - true_votes
-        
-        # 判断最终结果
-        total_valid_votes = len(boolean_decisions)
-        if false_votes > true_votes:
-            final_decision = "错误"
-            confidence = false_votes / total_valid_votes if total_valid_votes > 0 else 0
-        elif true_votes > false_votes:
-            final_decision = "正确"
-            confidence = true_votes / total_valid_votes if total_valid_votes > 0 else 0
-        else:
-            final_decision = "平局"
-            confidence = 0.5
-        
-        # 收集所有原因
-        reasons = statement_data['reason'].tolist()
-        combined_reasons = "; ".join(reasons)
-        
-        final_results.append({
-            "ID": statement_id,
-            "statement": statement,
-            "true_votes": true_votes,
-            "false_votes": false_votes,
-            "total_votes": total_valid_votes,
-            "final_decision": final_decision,
-            "confidence": confidence,
-            "reasons": combined_reasons
-        })
+    # 计算每个表述的投票结果：按ID分组一次性聚合（保持ID首次出现的顺序）
+    df_final = aggregate_votes(df_verification)
     
     # 保存最终结果
-    df_final = pd.DataFrame(final_results)
-    save_csv(df_final, final_csv)
+    save_csv(df_final, final_csv, for_excel=True)
     
     # 计算总体统计
     if not df_final.empty:
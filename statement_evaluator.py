@@ -18,36 +18,40 @@
 
 import argparse
 import json
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 from statement.extract_citations import extract_citations_from_text
 from statement.extract_no_citations import extract_no_citations_from_text
+from statement.extract_statements import extract_statements_from_text
 from statement.scrape_content import scrape_all
 from statement.match_text import match_sentences
 from statement.verify_alignment import verify
 
-from utils import read_csv, save_csv
+from utils import read_csv, save_csv, split_text_by_headers
+
+
+# arxiv_id格式通常为 YYMM.NNNNN，如 2101.01507；找不到标准格式时使用更宽松的匹配
+_ARXIV_RE = re.compile(r'(\d{4}\.\d{5})')
+_ARXIV_LOOSE_RE = re.compile(r'(\d{4}\.\d+)')
 
 
 def extract_arxiv_id_from_filename(filename: str) -> str:
     """从文件名中提取arxiv_id"""
-    # arxiv_id格式通常为 YYMM.NNNNN，如 2101.01507
-    pattern = r'(\d{4}\.\d{5})'
-    match = re.search(pattern, filename)
-    if match:
-        return match.group(1)
-    else:
-        # 如果没有找到标准格式，尝试更宽松的匹配
-        pattern = r'(\d{4}\.\d+)'
-        match = re.search(pattern, filename)
-        if match:
-            return match.group(1)
-    return None
+    match = _ARXIV_RE.search(filename) or _ARXIV_LOOSE_RE.search(filename)
+    return match.group(1) if match else None
 
 
-def process_single_json(json_file: Path, output_dir: Path, include_no_citations: bool = True):
-    """处理单个JSON文件"""
+def process_single_json(json_file: Path, output_dir: Path, include_no_citations: bool = True,
+                        fused_extraction: bool = False):
+    """处理单个JSON文件；fused_extraction 为 True 时步骤 1 与 1b 合并为每块一次 LLM 调用"""
     print(f"\n==> Processing JSON file: {json_file}")
     
     # 从文件名中提取arxiv_id
@@ -56,10 +60,13 @@ def process_single_json(json_file: Path, output_dir: Path, include_no_citations:
         print(f"[!] 无法从文件名中提取arxiv_id: {json_file}")
         return
     
-    # 读取JSON文件
+    # 读取JSON文件（安装了orjson时直接解析字节，更快且内存占用更小）
     try:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        if orjson is not None:
+            data = orjson.loads(json_file.read_bytes())
+        else:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
     except Exception as e:
         print(f"[!] 读取JSON文件失败: {e}")
         return
@@ -70,26 +77,27 @@ def process_single_json(json_file: Path, output_dir: Path, include_no_citations:
     # 候选字段名称
     candidate_fields = ['response', 'content', 'text', 'message', 'output', 'result']
     
-    # 首先尝试直接找到候选字段
-    for field in candidate_fields:
-        if field in data and isinstance(data[field], str) and len(data[field].strip()) > 50:
-            response_text = data[field]
-            print(f"[✓] 找到response字段: {field}")
-            break
+    # 首先尝试直接找到候选字段：取第一个合格的字段；原始长度不足时无需 strip
+    field = next(
+        (
+            name for name in candidate_fields
+            if isinstance(data.get(name), str) and len(data[name]) > 50 and len(data[name].strip()) > 50
+        ),
+        None,
+    )
+    if field is not None:
+        response_text = data[field]
+        print(f"[✓] 找到response字段: {field}")
     
-    # 如果没有找到，寻找最长的字符串字段
+    # 如果没有找到，寻找最长的字符串字段：按原始长度一次取最大，只对胜出者 strip 一次
     if not response_text:
-        longest_field = None
-        longest_length = 0
-        
-        for key, value in data.items():
-            if isinstance(value, str) and len(value.strip()) > longest_length:
-                longest_length = len(value.strip())
-                longest_field = key
-        
-        if longest_field and longest_length > 50:
-            response_text = data[longest_field]
-            print(f"[✓] 使用最长字段作为response: {longest_field} (长度: {longest_length})")
+        string_fields = [(key, value) for key, value in data.items() if isinstance(value, str)]
+        if string_fields:
+            longest_field, value = max(string_fields, key=lambda kv: len(kv[1]))
+            longest_length = len(value.strip())
+            if longest_length > 50:
+                response_text = value
+                print(f"[✓] 使用最长字段作为response: {longest_field} (长度: {longest_length})")
     
     # 如果还是没有找到合适的内容
     if not response_text:
@@ -100,37 +108,60 @@ def process_single_json(json_file: Path, output_dir: Path, include_no_citations:
     # 创建结果目录
     results_dir = output_dir / arxiv_id
     results_dir.mkdir(parents=True, exist_ok=True)
+    # 一次列出结果目录，后续各步骤的"已存在则跳过"判断都查这个集合，不再逐个 stat
+    with os.scandir(results_dir) as entries:
+        present = {entry.name for entry in entries}
     
     print(f"[✓] 提取的arxiv_id: {arxiv_id}")
     print(f"[✓] 文本内容长度: {len(response_text)} 字符")
     print(f"[✓] 结果文件将保存到: {results_dir}")
 
+    # 各提取步骤共用同一份分块结果，只分一次；所需 CSV 都已存在时不分块
+    text_blocks = None
+    if "citations.csv" not in present or (include_no_citations and "no_citations.csv" not in present):
+        text_blocks = split_text_by_headers(response_text)
+
+    # 1 + 1b) 合并提取：两个 CSV 都不存在时一次性生成，后续步骤直接读取
+    if (fused_extraction and include_no_citations
+            and "citations.csv" not in present
+            and "no_citations.csv" not in present):
+        extract_statements_from_text(
+            response_text,
+            results_dir / "citations.csv",
+            results_dir / "no_citations.csv",
+            text_blocks=text_blocks,
+        )
+        present.update({"citations.csv", "no_citations.csv"})
+
     # 1) 提取带引用表述
-    if Path(results_dir / "citations.csv").exists():
+    if "citations.csv" in present:
         print(f"[!] 跳过提取带引用表述，已存在 citations.csv 文件")
         df_citations = read_csv(results_dir / "citations.csv")
     else:
-        df_citations = extract_citations_from_text(response_text, results_dir / "citations.csv")
+        df_citations = extract_citations_from_text(
+            response_text, results_dir / "citations.csv", text_blocks=text_blocks
+        )
 
     # 新增：无引用表述处理
     if include_no_citations:
         print(f"\n==> 开始处理无引用表述...")
         
         # 1b) 提取无引用表述
-        if Path(results_dir / "no_citations.csv").exists():
+        if "no_citations.csv" in present:
             print(f"[!] 跳过提取无引用表述，已存在 no_citations.csv 文件")
             df_no_citations = read_csv(results_dir / "no_citations.csv")
         else:
             df_no_citations = extract_no_citations_from_text(
                 response_text, 
                 df_citations, 
-                results_dir / "no_citations.csv"
+                results_dir / "no_citations.csv",
+                text_blocks=text_blocks,
             )
         
         if not df_no_citations.empty:
             # 3b) 使用联网LLM验证无引用表述
             from statement.verify_no_citations_web import verify_no_citations_web
-            if Path(results_dir / "no_citations_web_final.csv").exists():
+            if "no_citations_web_final.csv" in present:
                 print(f"[!] 跳过验证无引用表述，已存在 no_citations_web_final.csv 文件")
             else:
                 df_verification, df_final = verify_no_citations_web(
@@ -145,21 +176,22 @@ def process_single_json(json_file: Path, output_dir: Path, include_no_citations:
     scrape_all(df_citations, "raw_texts")
 
     # 3) 匹配句子
-    if Path(results_dir / "matched.csv").exists():
+    if "matched.csv" in present:
         print(f"[!] 跳过匹配，已存在 matched.csv 文件")
         df_match = read_csv(results_dir / "matched.csv")
     else:
         df_match = match_sentences(df_citations, "raw_texts", results_dir / "matched.csv")
 
     # 4+5) 校对并计算 Match Rate
-    if Path(results_dir / "final.csv").exists():
+    if "final.csv" in present:
         print(f"[!] 跳过验证，已存在 final.csv 文件")
     else:
         verify(df_match, results_dir / "final.csv")
 
 
-def run_batch(input_dir: str | Path, output_dir: str | Path = "results", include_no_citations: bool = True):
-    """处理目录中的所有JSON文件"""
+def run_batch(input_dir: str | Path, output_dir: str | Path = "results", include_no_citations: bool = True,
+              fused_extraction: bool = False, max_workers: int = 4):
+    """处理目录中的所有JSON文件；不同 arxiv_id 的文件互不依赖，以 max_workers 个线程并发处理"""
     input_path = Path(input_dir)
     output_path = Path(output_dir)
     
@@ -179,13 +211,24 @@ def run_batch(input_dir: str | Path, output_dir: str | Path = "results", include
     # 创建输出目录
     output_path.mkdir(parents=True, exist_ok=True)
     
-    # 处理每个JSON文件
+    # 同一 arxiv_id 的文件共用一个结果目录，并发处理会同时读写同一批 CSV 与检查点：
+    # 按 arxiv_id 分组，每组作为一个任务，组内按原顺序依次处理
+    groups: dict = {}
     for json_file in json_files:
-        try:
-            process_single_json(json_file, output_path, include_no_citations)
-        except Exception as e:
-            print(f"[!] 处理文件 {json_file} 时出错: {e}")
-            continue
+        groups.setdefault(extract_arxiv_id_from_filename(json_file.name), []).append(json_file)
+    
+    def _process_group(files: list[Path]) -> None:
+        for json_file in files:
+            try:
+                process_single_json(json_file, output_path, include_no_citations, fused_extraction)
+            except Exception as e:
+                print(f"[!] 处理文件 {json_file} 时出错: {e}")
+    
+    # 处理每组JSON文件：耗时主要在网络与LLM调用上，线程池并发即可（LLM限流器与缓存在线程间共享）
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_process_group, files) for files in groups.values()]
+        for future in as_completed(futures):
+            future.result()
     
     print(f"\n[✓] 批处理完成，结果保存在: {output_path}")
 
@@ -203,7 +246,19 @@ if __name__ == "__main__":
         action="store_true", 
         help="Skip processing of non-cited statements"
     )
+    parser.add_argument(
+        "--fused-extraction",
+        action="store_true",
+        help="Extract cited and non-cited statements with one LLM call per block"
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        default=4,
+        help="Number of JSON files processed concurrently (default: 4)"
+    )
     args = parser.parse_args()
 
     # 直接调用批处理功能
-    run_batch(args.input_dir, args.output_dir, include_no_citations=not args.skip_no_citations)
\ No newline at end of file
+    run_batch(args.input_dir, args.output_dir, include_no_citations=not args.skip_no_citations,
+              fused_extraction=args.fused_extraction, max_workers=args.max_workers)
\ No newline at end of file
@@ -15,25 +15,33 @@
 """
 公共工具函数：链工厂、CSV 读写、重试装饰器、网页抓取等
 """
+import asyncio
+import csv
 import json
+import random
 import time
 import requests
+from requests.adapters import HTTPAdapter
 from pathlib import Path
 from typing import Any, Iterable, Callable, Optional
 import re
 from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
 import logging
 import threading
-from datetime import datetime, timedelta
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache, wraps
 import hashlib
 import pickle
 import os
 
 import pandas as pd
 import yaml
+from langchain_core.runnables import RunnableLambda
 from langchain_openai import ChatOpenAI, AzureChatOpenAI
-from tenacity import retry, stop_after_attempt, wait_random_exponential
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
 from tqdm import tqdm
 
 try:
@@ -41,22 +49,47 @@ try:
 except ImportError:
     FirecrawlApp = None
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import pyarrow  # noqa: F401  仅用于Parquet读写
+except ImportError:
+    pyarrow = None
+
 from config import (
     OPENAI_PROVIDER,
     OPENAI_API_KEY,
     DEFAULT_MODEL,
     TEMPERATURE,
     MAX_TOKENS,
+    LLM_MAX_CONCURRENCY,
+    LLM_TIMEOUT,
+    LLM_MAX_RETRIES,
+    LLM_RPM,
+    LLM_TPM,
     AZURE_OPENAI_ENDPOINT,
     AZURE_OPENAI_API_VERSION,
     AZURE_OPENAI_DEPLOYMENT_NAME,
     AZURE_OPENAI_API_KEY,
     WEB_LLM_KEY,
-    WEB_LLM_BASE_URL
+    WEB_LLM_BASE_URL,
+    WEB_LLM_RPM,
+    WEB_LLM_TPM,
+    WEB_LLM_TIMEOUT,
+    SPLIT_CACHE_DIR,
 )
 
 # 全局变量：文本块大小限制
 BLOCK_SIZE = 16384  # 字符数限制
+# 一级、二级、三级markdown标题行（"# "、"## "、"### " 开头）。
+# 以字面量换行符开头，正则引擎可以直接跳到候选位置，而不是在每个字符上检查 ^ 锚点；
+# 匹配位置 +1 即标题行起点，文本首行单独判断
+_HEADER_RE = re.compile(r'\n#{1,3} ')
+_HEADER_PREFIXES = ("# ", "## ", "### ")
+_NON_SPACE_RE = re.compile(r'\S')
 
 # 联网模型配置
 WEB_LLM_CONFIGS = {
@@ -78,13 +111,113 @@ WEB_LLM_CONFIGS = {
     },
 }
 
+class RateLimiter:
+    """
+    线程安全的令牌桶限流器，同时限制每分钟请求数（rpm）和 token 数（tpm），0 表示不限制
+
+    在请求发出前主动等待额度，避免并发请求一起撞上速率墙后再集体退避重试
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._last = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last
+        self._last = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def acquire(self, est_tokens: int = 0) -> None:
+        """阻塞直到有 1 个请求额度和 est_tokens 个 token 额度"""
+        if not self.rpm and not self.tpm:
+            return
+        # 单次请求超过整个桶容量时按桶容量计，否则永远等不到
+        est_tokens = min(est_tokens, self.tpm) if self.tpm else 0
+        with self._cond:
+            while True:
+                self._refill()
+                lack_requests = 1 - self._requests if self.rpm else 0
+                lack_tokens = est_tokens - self._tokens if self.tpm else 0
+                if lack_requests <= 0 and lack_tokens <= 0:
+                    if self.rpm:
+                        self._requests -= 1
+                    if self.tpm:
+                        self._tokens -= est_tokens
+                    return
+                wait_time = max(
+                    lack_requests * 60 / self.rpm if lack_requests > 0 else 0,
+                    lack_tokens * 60 / self.tpm if lack_tokens > 0 else 0,
+                )
+                self._cond.wait(timeout=wait_time)
+
+    @contextmanager
+    def reserve(self, est_tokens: int = 0):
+        """用法：with rate_limiter.reserve(est_tokens): chain.invoke(...)"""
+        self.acquire(est_tokens)
+        yield
+
+
+def estimate_tokens(*texts: Any) -> int:
+    """粗略估算 token 数（约 4 个字符 1 个 token）"""
+    return sum(len(str(text)) for text in texts) // 4
+
+
+# 全局限流器：普通 LLM 与联网 LLM 分属不同服务，各自独立限流
+llm_rate_limiter = RateLimiter(LLM_RPM, LLM_TPM)
+web_llm_rate_limiter = RateLimiter(WEB_LLM_RPM, WEB_LLM_TPM)
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数或HTTP日期），返回需等待的秒数，无法解析时返回 None"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
 class WebLLMClient:
     """支持联网的LLM客户端"""
     
-    def __init__(self, model_name: str):
+    def __init__(self, model_name: str, timeout: float = WEB_LLM_TIMEOUT):
         self.model_name = model_name
+        self.timeout = timeout
         self.config = WEB_LLM_CONFIGS[model_name]
         self.url = self.config["base_url"] + self.config["api_key"]
+        # 复用连接（keep-alive），避免每次调用都重新建立 TCP+TLS 连接；重试由 generate 自行处理
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=16, max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # 最近一次触发速率限制后约定的恢复时刻；所有线程在发请求前都先等到该时刻，避免一起撞墙
+        self._backoff_lock = threading.Lock()
+        self._backoff_until = 0.0
+    
+    def _wait_for_backoff(self) -> None:
+        with self._backoff_lock:
+            delay = self._backoff_until - time.time()
+        if delay > 0:
+            time.sleep(delay)
+    
+    def _defer(self, wait_time: float) -> None:
+        with self._backoff_lock:
+            self._backoff_until = max(self._backoff_until, time.time() + wait_time)
     
     def generate(self, messages: list) -> str:
         """调用联网LLM生成回复，对速率限制错误无限重试"""
@@ -92,36 +225,46 @@ class WebLLMClient:
         retry_count = 0
         base_wait_time = 1.0  # 基础等待时间
         
+        # 请求体只序列化一次，重试时直接复用；安装了orjson时用其编码，更快
+        payload = {
+            "model": self.config["model_name"],
+            "messages": messages,
+            "tools": [{"type": "google_search"}]
+        }
+        body = orjson.dumps(payload) if orjson is not None else json.dumps(payload).encode("utf-8")
+        
         while True:  # 速率限制错误时无限循环
+            self._wait_for_backoff()
+            rate_limited = False
+            retry_after = None
             try:
-                response = requests.post(
+                web_llm_rate_limiter.acquire(estimate_tokens(*(m.get("content", "") for m in messages)))
+                response = self.session.post(
                     url=self.url,
-                    json={
-                        "model": self.config["model_name"],
-                        "messages": messages,
-                        "tools": [{"type": "google_search"}]
-                    },
+                    data=body,
                     headers={"Content-Type": "application/json"},
-                    timeout=300
+                    timeout=self.timeout
                 )
                 
                 if response.status_code == 200:
-                    result = response.json()
+                    result = orjson.loads(response.content) if orjson is not None else response.json()
                     return result.get("choices", [{}])[0].get("message", {}).get("content", "")
                 elif response.status_code == 429:
-                    # HTTP 429是速率限制错误码
+                    # HTTP 429是速率限制错误码，服务端给出 Retry-After 时按其等待
+                    rate_limited = True
+                    retry_after = _parse_retry_after(response.headers.get("Retry-After"))
                     raise Exception(f"Rate limit exceeded: {response.text}")
                 else:
                     raise Exception(f"HTTP {response.status_code}: {response.text}")
                     
             except Exception as e:
-                error_msg = str(e)
-                is_rate_limit = 'reach token limit' in error_msg
-                
-                if is_rate_limit:
-                    # 速率限制错误：无限重试，指数退避
+                if rate_limited or is_token_limit_error(e):
+                    # 速率限制错误：无限重试，优先遵循 Retry-After，否则指数退避加完全随机抖动，
+                    # 避免多个线程同时重试再次集中触发限流
                     retry_count += 1
-                    wait_time = min(base_wait_time * (2 ** min(retry_count-1, 6)), 300)  # 最大等待5分钟
+                    max_wait = min(base_wait_time * (2 ** min(retry_count-1, 6)), 300)  # 最大等待5分钟
+                    wait_time = min(retry_after, 300) if retry_after is not None else random.uniform(0, max_wait)
+                    self._defer(wait_time)
                     print(f"{self.model_name}速率限制 (第{retry_count}次重试): {e}, 等待{wait_time:.1f}秒...")
                     time.sleep(wait_time)
                     continue
@@ -135,26 +278,39 @@ class WebLLMClient:
                         continue
                     else:
                         raise Exception(f"{self.model_name}客户端调用最终失败: {e}")
+    
+    async def agenerate(self, messages: list) -> str:
+        """
+        generate 的异步版本，便于在 asyncio 代码中用 asyncio.gather 并发发起多个请求；
+        在线程中执行同步的 generate，复用其连接池、限流与重试逻辑
+        """
+        return await asyncio.to_thread(self.generate, messages)
 
-def build_web_llms():
-    """返回两个支持联网的LLM客户端"""
+def build_web_llms(timeout: float = WEB_LLM_TIMEOUT):
+    """返回两个支持联网的LLM客户端，timeout 为单次请求超时（秒）"""
     return [
-        WebLLMClient("gemini-2.5-pro"),
-        WebLLMClient("gemini-2.5-flash")
+        WebLLMClient("gemini-2.5-pro", timeout=timeout),
+        WebLLMClient("gemini-2.5-flash", timeout=timeout)
     ]
 
 def build_llm(
     model: Optional[str] = None,
     temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    timeout: float = LLM_TIMEOUT,
+    max_retries: int = LLM_MAX_RETRIES,
 ):
     """
     根据 OPENAI_PROVIDER 返回 ChatOpenAI 或 AzureChatOpenAI。
 
     - model:   可覆盖默认模型 / deployment 名
     - temperature: 覆盖默认温度
+    - max_tokens: 覆盖默认输出 token 上限
+    - timeout / max_retries: 单次请求超时（秒）与客户端重试次数
     """
     _temp = TEMPERATURE if temperature is None else temperature
     _model = model or DEFAULT_MODEL
+    _max_tokens = max_tokens or MAX_TOKENS
 
     if OPENAI_PROVIDER == "azure":
         return AzureChatOpenAI(
@@ -163,22 +319,35 @@ def build_llm(
             openai_api_key=AZURE_OPENAI_API_KEY,
             openai_api_type="azure",
             model=AZURE_OPENAI_DEPLOYMENT_NAME or _model,
-            max_tokens=MAX_TOKENS,
+            max_tokens=_max_tokens,
             temperature=_temp,
+            timeout=timeout,
+            max_retries=max_retries,
         )
     # fall back to官方 OpenAI
     return ChatOpenAI(
         model=_model,
         openai_api_key=OPENAI_API_KEY,
-        max_tokens=MAX_TOKENS,
+        max_tokens=_max_tokens,
         temperature=_temp,
+        timeout=timeout,
+        max_retries=max_retries,
     )
 
 
+@lru_cache(maxsize=8)
+def _load_yaml_config(path: str, mtime_ns: int):
+    """解析yaml配置文件；以路径和修改时间为键缓存，文件改动后自动重新解析"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+
 def build_test_model(model_name: str):
     """
     从evaluation_models.yaml文件读取模型配置，构建测试模型。
     支持默认配置和模型特定配置的覆盖机制。
+    配置文件未修改时同一模型名只构建一次，后续调用直接返回缓存的实例（langchain 客户端可在线程间共享）；
+    修改配置文件后下次调用会重新解析并重建。
     
     配置要求：
     - 必需字段：api_key, max_tokens, temperature（必须在每个模型中明确指定）
@@ -201,9 +370,15 @@ def build_test_model(model_name: str):
     if not yaml_file.exists():
         raise FileNotFoundError(f"配置文件 {yaml_file} 不存在")
     
+    # 缓存键包含配置文件的修改时间，文件改动后自动失效
+    return _build_test_model(model_name, str(yaml_file.resolve()), yaml_file.stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=32)
+def _build_test_model(model_name: str, path: str, mtime_ns: int):
+    """build_test_model 的缓存实现，以 (模型名, 配置文件路径, 修改时间) 为键"""
     try:
-        with open(yaml_file, 'r', encoding='utf-8') as f:
-            full_config = yaml.safe_load(f)
+        full_config = _load_yaml_config(path, mtime_ns)
     except yaml.YAMLError as e:
         raise yaml.YAMLError(f"解析yaml文件失败: {e}")
     
@@ -252,15 +427,157 @@ def build_test_model(model_name: str):
         model=model_name,  # 使用model_name作为deployment名称
         max_tokens=final_config['max_tokens'],  # 必须在模型配置中指定
         temperature=final_config['temperature'],  # 必须在模型配置中指定
+        timeout=final_config.get('timeout', LLM_TIMEOUT),
+        max_retries=final_config.get('max_retries', LLM_MAX_RETRIES),
     )
 
 
-def save_csv(df: pd.DataFrame, out_path: str | Path) -> None:
+def _parquet_sidecar(csv_path: str | Path) -> Path:
+    """CSV 旁的 Parquet 副本路径：xxx.csv -> xxx.parquet"""
+    return Path(csv_path).with_suffix(".parquet")
+
+
+def _csv_encoding(for_excel: bool) -> str:
+    """面向用户、可能用Excel打开的最终结果带BOM（utf-8-sig），流水线内部的中间文件用纯utf-8"""
+    return "utf-8-sig" if for_excel else "utf-8"
+
+
+def save_csv(df: pd.DataFrame, out_path: str | Path, for_excel: bool = False) -> None:
     Path(out_path).parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(out_path, index=False, encoding="utf-8-sig")
+    df.to_csv(out_path, index=False, encoding=_csv_encoding(for_excel))
+    # 安装了pyarrow时同时写一份Parquet副本，重跑时 read_csv 直接读取，省去CSV解析
+    if pyarrow is not None:
+        sidecar = _parquet_sidecar(out_path)
+        try:
+            df.to_parquet(sidecar, index=False)
+        except Exception:
+            # 混合类型等无法转为Parquet的列：不写副本，并删除可能过期的旧副本
+            sidecar.unlink(missing_ok=True)
+    print(f"[✓] Saved → {out_path}")
+
+def save_rows_csv(rows: Iterable[dict], out_path: str | Path, for_excel: bool = False) -> None:
+    """
+    用标准库csv直接写出字典列表，适合行数很少的小表，省去构造DataFrame的开销
+
+    列为所有行键的并集（按首次出现顺序），缺失值写为空；编码规则与 save_csv 一致
+    """
+    rows = list(rows)
+    fieldnames = list(dict.fromkeys(key for row in rows for key in row))
+    Path(out_path).parent.mkdir(parents=True, exist_ok=True)
+    with open(out_path, "w", newline="", encoding=_csv_encoding(for_excel)) as f:
+        if fieldnames:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(rows)
+    print(f"[✓] Saved → {out_path}")
+
+class CsvCheckpoint:
+    """
+    逐行追加的CSV检查点：每完成一条结果立即写入并flush，进程中断后重跑时可读回已完成的行，
+    只需补做剩余部分；全部完成后由调用方写出最终文件并删除检查点
+    """
+
+    def __init__(self, path: str | Path, fieldnames: Iterable[str]):
+        self.path = Path(path)
+        self.fieldnames = list(fieldnames)
+        self._file = None
+        self._writer = None
+
+    @classmethod
+    def for_output(cls, out_path: str | Path, fieldnames: Iterable[str]) -> "CsvCheckpoint":
+        """最终输出 out.csv 对应的检查点文件为 out.partial.csv"""
+        out_path = Path(out_path)
+        return cls(out_path.with_name(f"{out_path.stem}.partial.csv"), fieldnames)
+
+    def load(self) -> list[dict]:
+        """读回已写入的行；中断时写了一半的末行会被丢弃"""
+        if not self.path.exists():
+            return []
+        text = self.path.read_text(encoding="utf-8")
+        if text and not text.endswith("\n"):
+            text = text[:text.rfind("\n") + 1]
+            self.path.write_text(text, encoding="utf-8")
+        rows = [
+            row for row in csv.DictReader(text.splitlines(keepends=True))
+            if None not in row and None not in row.values()
+        ]
+        if rows:
+            print(f"[✓] 从检查点 {self.path} 恢复 {len(rows)} 条结果")
+        return rows
+
+    def resume(self, records: list[dict], key_fields: Iterable[str]) -> tuple[list, list[int]]:
+        """
+        将检查点中已完成的行按 key_fields 对应回 records 中的位置（重复的键按出现顺序逐一对应）
+
+        Returns:
+            (results, pending)：results 与 records 等长，已完成的位置为检查点中的行，其余为 None；
+            pending 为仍需处理的下标
+        """
+        key_fields = list(key_fields)
+        done: dict[tuple, list[dict]] = {}
+        for row in self.load():
+            done.setdefault(tuple(row[k] for k in key_fields), []).append(row)
+
+        results: list = [None] * len(records)
+        pending: list[int] = []
+        for i, record in enumerate(records):
+            rows = done.get(tuple(str(record[k]) for k in key_fields))
+            if rows:
+                results[i] = rows.pop(0)
+            else:
+                pending.append(i)
+        return results, pending
+
+    def __enter__(self) -> "CsvCheckpoint":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        is_new = not self.path.exists() or self.path.stat().st_size == 0
+        self._file = open(self.path, "a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(
+            self._file, fieldnames=self.fieldnames, extrasaction="ignore", lineterminator="\n"
+        )
+        if is_new:
+            self._writer.writeheader()
+            self._file.flush()
+        return self
+
+    def write(self, row: dict) -> None:
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def __exit__(self, *exc) -> None:
+        self._file.close()
+        self._file = self._writer = None
+
+    def remove(self) -> None:
+        self.path.unlink(missing_ok=True)
+
+def save_parquet(df: pd.DataFrame, out_path: str | Path) -> Path:
+    """
+    以zstd压缩的Parquet格式保存DataFrame，比CSV更小、重新加载更快
+
+    未安装pyarrow时回退为同名的CSV文件；返回实际写入的路径
+    """
+    out_path = Path(out_path)
+    if pyarrow is None:
+        print("[!] 未安装pyarrow，改为保存CSV")
+        out_path = out_path.with_suffix(".csv")
+        save_csv(df, out_path)
+        return out_path
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    df.to_parquet(out_path, index=False, compression="zstd")
     print(f"[✓] Saved → {out_path}")
+    return out_path
 
 def read_csv(file_path: str | Path) -> pd.DataFrame:
+    """读取CSV；存在不早于CSV的Parquet副本时优先读取副本（CSV被手动修改过则仍读CSV）"""
+    sidecar = _parquet_sidecar(file_path)
+    if pyarrow is not None and sidecar.exists():
+        try:
+            if sidecar.stat().st_mtime >= Path(file_path).stat().st_mtime:
+                return pd.read_parquet(sidecar)
+        except Exception:
+            pass
+    # utf-8-sig 同时兼容带BOM的旧文件与不带BOM的新文件
     return pd.read_csv(file_path, encoding="utf-8-sig")
 
 
@@ -277,6 +594,65 @@ def retry_async(
         wait=wait_random_exponential(min=min_wait, max=max_wait),
     )
 
+
+def is_token_limit_error(exc: BaseException) -> bool:
+    """判断异常是否为接口的 token 速率限制"""
+    return "reach token limit" in str(exc)
+
+
+def retry_on_token_limit(
+    attempts: int = 5, max_wait: float = 60.0
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
+    """
+    仅在触发 token 速率限制时重试的装饰器：指数退避加随机抖动，最多重试 attempts 次；
+    其他异常立即抛出，重试用尽后抛出最后一次的原始异常
+    """
+    def _log_retry(retry_state) -> None:
+        print(f"[!] 速率墙，第{retry_state.attempt_number}次重试... {retry_state.outcome.exception()}")
+
+    return retry(
+        retry=retry_if_exception(is_token_limit_error),
+        wait=wait_random_exponential(multiplier=1, max=max_wait),
+        stop=stop_after_attempt(attempts),
+        before_sleep=_log_retry,
+        reraise=True,
+    )
+
+def batch_invoke_with_retry(chain, inputs: list[dict], max_concurrency: int = LLM_MAX_CONCURRENCY) -> list:
+    """
+    用 chain.batch 并发调用 LLM，返回与 inputs 顺序一致的结果列表（成功为模型回复，失败为异常对象）
+
+    触发 token 速率限制的输入会被收集起来，退避一段时间后只对这些输入重新 batch；其他异常不重试
+    """
+    def _limited_invoke(chain_input: dict):
+        with llm_rate_limiter.reserve(estimate_tokens(*chain_input.values())):
+            return chain.invoke(chain_input)
+
+    # 每个并发请求在发出前先从限流器获取额度
+    limited_chain = RunnableLambda(_limited_invoke)
+
+    results: list = [None] * len(inputs)
+    pending = list(range(len(inputs)))
+    retry_round = 0
+    while pending:
+        outputs = limited_chain.batch(
+            [inputs[i] for i in pending],
+            config={"max_concurrency": max_concurrency},
+            return_exceptions=True,
+        )
+        retry_indices = []
+        for i, output in zip(pending, outputs):
+            results[i] = output
+            if isinstance(output, Exception) and is_token_limit_error(output):
+                retry_indices.append(i)
+        if retry_indices:
+            retry_round += 1
+            wait_time = min(2 ** retry_round, 60)
+            print(f"[!] 速率墙，{len(retry_indices)} 个请求将在 {wait_time} 秒后重试...")
+            time.sleep(wait_time)
+        pending = retry_indices
+    return results
+
 def post_process_json(raw: str) -> str:
     """
     处理 JSON 字符串，确保符合 JSON 格式
@@ -286,103 +662,167 @@ def post_process_json(raw: str) -> str:
     return raw
 
 
+_JSON_DECODER = json.JSONDecoder()
 
-def split_text_by_headers(text: str, max_size: int = BLOCK_SIZE) -> list[str]:
+
+def parse_llm_json(raw: str, start_chars: str = "{["):
+    """
+    解析 LLM 回复中的 JSON
+
+    先按原样（去掉 ```json 包裹后）整体解析；失败时从第一个 start_chars 中的字符处
+    用 raw_decode 单次解析出第一个完整的 JSON 值，忽略前后多余的文字
+
+    Raises:
+        json.JSONDecodeError: 两种方式都无法解析
     """
-    将markdown文本按标题拆分成不超过max_size的块
-    1. 首先检索出所有一级、二级、三级标题的index
-    2. 根据这些index进行组装block
-    3. 如果超过block_size则回退到上一个index
-    4. 验证所有block拼接后等于原文本
+    text = post_process_json(raw)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        positions = [pos for pos in (text.find(ch) for ch in start_chars) if pos >= 0]
+        if not positions:
+            raise e
+        return _JSON_DECODER.raw_decode(text, min(positions))[0]
+
+
+# 分块算法的版本号，修改分块逻辑后递增，使旧的磁盘缓存失效
+_SPLIT_VERSION = 1
+
+
+def _split_disk_cache(func: Callable[[str, int], list]) -> Callable[[str, int], list]:
+    """
+    分块结果的磁盘缓存：以 blake2b(文本) + max_size + 算法版本为键，
+    把 func 的返回值 pickle 到 SPLIT_CACHE_DIR 下；读写失败时直接重新计算
     """
-    lines = text.split('\n')
+    @wraps(func)
+    def wrapper(text: str, max_size: int = BLOCK_SIZE) -> list:
+        if not SPLIT_CACHE_DIR:
+            return func(text, max_size)
+
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+        cache_file = Path(SPLIT_CACHE_DIR) / f"{digest}_{max_size}_v{_SPLIT_VERSION}.pkl"
+        try:
+            return pickle.loads(cache_file.read_bytes())
+        except Exception:
+            pass
+
+        result = func(text, max_size)
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            # 先写临时文件再原子替换，并发处理多个报告时不会读到写了一半的文件
+            tmp_file = cache_file.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp_file.write_bytes(pickle.dumps(result))
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            pass
+        return result
+
+    return wrapper
+
+
+@_split_disk_cache
+def split_text_spans_by_headers(text: str, max_size: int = BLOCK_SIZE) -> list[tuple[int, int]]:
+    """
+    将markdown文本按标题拆分成不超过max_size的块，只返回各块在原文中的 (start, end) 偏移，
+    调用方按需 text[start:end] 取出内容，不必一次性复制出所有块
+    1. 首先检索出所有一级、二级、三级标题的起始位置
+    2. 根据这些位置进行组装block
+    3. 如果超过block_size则回退到上一个标题
+    相邻两块之间恰好隔一个换行符
+    """
+    # 第一步：用预编译的正则在整段文本上一次扫描，记录所有标题行的起始偏移
+    header_starts = [0] if text.startswith(_HEADER_PREFIXES) else []
+    header_starts += [m.start() + 1 for m in _HEADER_RE.finditer(text)]
     
-    # 第一步：找到所有标题行的index
-    header_indices = []
-    for i, line in enumerate(lines):
-        # 检查是否是标题行（一级、二级、三级标题）
-        if line.startswith('#') and (
-            line.startswith('# ') or 
-            line.startswith('## ') or 
-            line.startswith('### ')
-        ):
-            header_indices.append(i)
+    # 如果没有标题，直接按行累积、按大小分割：
+    # 每块用 rfind 在大小上限内反向找最后一个换行符，循环次数为块数而不是行数，
+    # 且不必预先收集所有行的位置
+    if not header_starts:
+        spans = []
+        block_start = 0
+        while True:
+            # 块内最后一行的换行符位置 stop 需满足 stop + 1 - block_start <= max_size
+            limit = block_start + max_size
+            if len(text) < limit:
+                spans.append((block_start, len(text)))
+                return spans
+            stop = text.rfind('\n', block_start, limit)
+            if stop == -1:
+                # 单行超长时也至少放入一行
+                stop = text.find('\n', block_start)
+                if stop == -1:
+                    spans.append((block_start, len(text)))
+                    return spans
+            spans.append((block_start, stop))
+            block_start = stop + 1
     
-    # 如果没有标题，直接按大小分割
-    if not header_indices:
-        blocks = []
-        current_block = []
-        current_size = 0
-        
-        for line in lines:
-            line_size = len(line) + 1  # +1 for newline
-            if current_size + line_size > max_size and current_block:
-                blocks.append('\n'.join(current_block))
-                current_block = [line]
-                current_size = line_size
-            else:
-                current_block.append(line)
-                current_size += line_size
-        
-        if current_block:
-            blocks.append('\n'.join(current_block))
-        
-        # 验证
-        reconstructed_text = '\n'.join(blocks)
-        assert reconstructed_text == text, "分块后重构的文本与原文本不一致"
-        return blocks
+    # 添加文档开始和结束的虚拟位置：末尾取 len(text)+1，相当于"最后一行之后那一行"的起点。
+    # 从行起点 a 到行起点 b 的内容（不含 b 之前的换行符）为 text[a:b-1]，a == b 时为空
+    text_end = len(text) + 1
+    all_starts = [0] + header_starts + [text_end]
     
-    # 添加文档开始和结束的虚拟index，方便处理
-    all_indices = [0] + header_indices + [len(lines)]
+    def _span(a: int, b: int) -> tuple[int, int]:
+        return (a, b - 1) if a < b else (a, a)
     
-    blocks = []
+    spans = []
     current_start = 0
     
-    # 第二步：根据标题index组装block
-    for i in range(1, len(all_indices)):
-        current_end = all_indices[i]
+    # 第二步：根据标题位置组装block
+    for i in range(1, len(all_starts)):
+        current_end = all_starts[i]
         
-        # 尝试构建从current_start到current_end的block
-        candidate_lines = lines[current_start:current_end]
-        candidate_text = '\n'.join(candidate_lines)
-        
-        # 如果超过大小限制
-        if len(candidate_text) > max_size:
+        # 如果从current_start到current_end的block超过大小限制
+        if current_end - 1 - current_start > max_size:
             # 如果current_start就是前一个分割点，说明单个段落太大，强制分割
-            if current_start == all_indices[i-1]:
-                blocks.append(candidate_text)
+            if current_start == all_starts[i-1]:
+                spans.append(_span(current_start, current_end))
                 current_start = current_end
             else:
                 # 回退到上一个标题，先保存之前的内容
-                prev_lines = lines[current_start:all_indices[i-1]]
-                if prev_lines:  # 确保不为空
-                    blocks.append('\n'.join(prev_lines))
-                current_start = all_indices[i-1]
+                if current_start < all_starts[i-1]:  # 确保不为空
+                    spans.append(_span(current_start, all_starts[i-1]))
+                current_start = all_starts[i-1]
                 
                 # 重新处理当前段落
-                current_lines = lines[current_start:current_end]
-                current_text = '\n'.join(current_lines)
-                blocks.append(current_text)
+                spans.append(_span(current_start, current_end))
                 current_start = current_end
         else:
             # 如果是最后一个，直接添加并更新current_start
-            if i == len(all_indices) - 1:
-                if candidate_lines:  # 确保不为空
-                    blocks.append(candidate_text)
+            if i == len(all_starts) - 1:
+                if current_start < current_end:  # 确保不为空
+                    spans.append(_span(current_start, current_end))
                 current_start = current_end  # 重要：更新current_start，避免重复处理
             # 否则继续累积，在下一轮检查
     
     # 只有当还有未处理的内容时才添加
-    if current_start < len(lines):
-        remaining_lines = lines[current_start:]
-        if remaining_lines:  # 确保不为空
-            blocks.append('\n'.join(remaining_lines))
-    
-    # 过滤掉空的blocks
-    blocks = [block for block in blocks if block.strip()]
+    if current_start < text_end:
+        spans.append((current_start, len(text)))
     
-    # 第三步：验证所有block拼接后等于原文本
-    reconstructed_text = '\n'.join(blocks)
-    assert reconstructed_text == text, f"分块后重构的文本与原文本不一致\n原文长度: {len(text)}\n重构长度: {len(reconstructed_text)}"
+    # 过滤掉空白的blocks（在原文上查找非空白字符，不复制子串）
+    return [(start, end) for start, end in spans if _NON_SPACE_RE.search(text, start, end)]
+
+
+def _spans_tile_text(text: str, spans: list[tuple[int, int]]) -> bool:
+    """
+    检查各块首尾相接、块间恰好隔一个换行符且覆盖全文，
+    等价于 '\\n'.join(blocks) == text，但只需 O(块数) 而不必重建整段文本
+    """
+    if not spans:
+        return text == ''
+    if spans[0][0] != 0 or spans[-1][1] != len(text):
+        return False
+    return all(
+        next_start == end + 1 and text[end] == '\n'
+        for (_, end), (next_start, _) in zip(spans, spans[1:])
+    )
+
+
+def split_text_by_headers(text: str, max_size: int = BLOCK_SIZE) -> list[str]:
+    """
+    将markdown文本按标题拆分成不超过max_size的块（见 split_text_spans_by_headers），
+    返回各块的文本；先在偏移上验证所有block拼接后等于原文本
+    """
+    spans = split_text_spans_by_headers(text, max_size)
+    assert _spans_tile_text(text, spans), f"分块后重构的文本与原文本不一致\n原文长度: {len(text)}"
     
-    return blocks
\ No newline at end of file
+    return [text[start:end] for start, end in spans]